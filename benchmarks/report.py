@@ -0,0 +1,81 @@
+# Times the report command over a synthetic history of a million sessions.
+#
+#   python -m benchmarks.report [sessions]
+
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.scratch import scratch_core
+from qtimer.cmd_line import QTimerCommandLine
+from qtimer.model import Project, Ticket, Timer, Session
+from qtimer.util import autocommit, chunked
+
+PROJECTS = 20
+TICKETS_PER_PROJECT = 25
+SESSIONS_PER_TIMER = 50
+BATCH_SIZE = 10000
+
+GROUPINGS = (['day'], ['week'], ['project'], ['ticket'], ['billable'],
+	['project', 'week'], )
+
+
+def populate(core, sessionCount):
+	random.seed(0)
+	ticketCount = PROJECTS * TICKETS_PER_PROJECT
+	timerCount = max(sessionCount // SESSIONS_PER_TIMER, 1)
+	origin = datetime(2020, 1, 1)
+
+	with autocommit(core.session) as session:
+		session.execute(Project.__table__.insert(), [
+			{ 'id': p, 'name': 'Project %d' % p } for p in range(1, PROJECTS + 1) ])
+		session.execute(Ticket.__table__.insert(), [
+			{ 'id': t, 'name': 'Ticket %d' % t, 'ticket_id': t,
+				'project_id': (t - 1) // TICKETS_PER_PROJECT + 1 }
+			for t in range(1, ticketCount + 1) ])
+		session.execute(Timer.__table__.insert(), [
+			{ 'id': t, 'name': 'Timer %d' % t, 'posted': False,
+				'billable_status': t % 2, 'ticket_id': t % ticketCount + 1,
+				'closed_seconds': 0 }
+			for t in range(1, timerCount + 1) ])
+
+	def sessions():
+		for i in range(sessionCount):
+			start = origin + timedelta(minutes=random.randrange(3 * 365 * 24 * 60))
+			yield { 'timer_id': i % timerCount + 1, 'start': start,
+				'end': start + timedelta(minutes=random.randrange(5, 240)) }
+
+	for batch in chunked(sessions(), BATCH_SIZE):
+		with autocommit(core.session) as session:
+			session.execute(Session.__table__.insert(), batch)
+
+
+def main(sessionCount=1000000):
+	logging.basicConfig(level=logging.WARNING)
+	with tempfile.TemporaryDirectory() as directory:
+		core = scratch_core(directory)
+
+		start = time.time()
+		populate(core, sessionCount)
+		print('Created %d sessions in %.1fs' % (sessionCount, time.time() - start))
+
+		program = QTimerCommandLine(core)
+		with open(os.devnull, 'w') as devnull:
+			for by in GROUPINGS:
+				args = program.parseArgs(['report', '--by'] + by)
+				start = time.time()
+				with redirect_stdout(devnull):
+					rows = program.executeCommand(args)
+				print('report --by %-14s %6d rows in %.2fs' % (' '.join(by),
+					len(rows), time.time() - start))
+
+		core.close()
+
+
+if __name__ == '__main__':
+	main(*(int(arg) for arg in sys.argv[1:]))
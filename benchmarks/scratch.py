@@ -0,0 +1,12 @@
+# A throwaway qTimer setup for the benchmarks, using the same scratch
+# config as the tests
+
+from qtimer.core import QTimerCore
+from tests.support import scratch_config
+
+
+def scratch_core(directory):
+	''' A core whose database has been created through the migrations '''
+	core = QTimerCore(scratch_config(directory))
+	core.session
+	return core
@@ -0,0 +1,65 @@
+# Compares writing synced tickets one ORM object at a time, as sync used to,
+# with the executemany path of QTimerCore._applyDelta.
+#
+#   python -m benchmarks.sync_insert [tickets]
+
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.scratch import scratch_core
+from qtimer.model import Project, Ticket
+from qtimer.util import autocommit
+
+PROJECTS = 100
+
+
+def make_projects():
+	return [ Project(id=p, name='Project %d' % p) for p in range(1, PROJECTS + 1) ]
+
+
+def make_tickets(count):
+	return [ Ticket(id=t, name='Ticket %d' % t, ticket_id=t,
+		project_id=t % PROJECTS + 1) for t in range(1, count + 1) ]
+
+
+def per_row(core, tickets):
+	with autocommit(core.session) as session:
+		for ticket in tickets:
+			session.add(ticket)
+
+
+def bulk(core, tickets):
+	with autocommit(core.session) as session:
+		core._applyDelta(session, Ticket, tickets)
+
+
+def timed(name, write, ticketCount):
+	with tempfile.TemporaryDirectory() as directory:
+		core = scratch_core(directory)
+		with autocommit(core.session) as session:
+			core._applyDelta(session, Project, make_projects())
+
+		tickets = make_tickets(ticketCount)
+		start = time.time()
+		write(core, tickets)
+		elapsed = time.time() - start
+
+		assert core.session.query(Ticket).count() == ticketCount
+		core.close()
+
+	print('%-8s %7d rows in %6.2fs, %9.0f rows/s' % (name, ticketCount,
+		elapsed, ticketCount / elapsed))
+	return elapsed
+
+
+def main(ticketCount=50000):
+	logging.basicConfig(level=logging.WARNING)
+	before = timed('per-row', per_row, ticketCount)
+	after = timed('bulk', bulk, ticketCount)
+	print('bulk is %.1fx faster' % (before / after))
+
+
+if __name__ == '__main__':
+	main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,117 @@
+# Runs qtimer commands in a detached process so the caller doesn't have to wait
+
+from contextlib import contextmanager
+from os import path, makedirs
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from qtimer.env import DATA_DIR
+
+LOCK_NAME = '%s.lock'
+
+# A lock older than this (in seconds) belonged to a process that died
+LOCK_TIMEOUT = 60 * 60
+
+BackgroundLogger = logging.getLogger(__name__)
+
+# Locks taken by this process
+_heldLocks = set()
+
+
+def lock_path(name):
+	return path.join(DATA_DIR, LOCK_NAME % name)
+
+
+def is_locked(name):
+	lockFile = lock_path(name)
+	if not path.exists(lockFile):
+		return False
+	return (time.time() - path.getmtime(lockFile)) < LOCK_TIMEOUT
+
+
+def acquire_lock(name):
+	if not path.exists(DATA_DIR):
+		makedirs(DATA_DIR)
+
+	lockFile = lock_path(name)
+	if path.exists(lockFile) and not is_locked(name):
+		BackgroundLogger.warn('Removing stale lock %s', lockFile)
+		os.remove(lockFile)
+
+	try:
+		fd = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+	except FileExistsError:
+		return False
+
+	with os.fdopen(fd, 'w') as f:
+		f.write(str(os.getpid()))
+	_heldLocks.add(name)
+	return True
+
+
+def release_lock(name):
+	_heldLocks.discard(name)
+	try:
+		os.remove(lock_path(name))
+	except FileNotFoundError:
+		pass
+
+
+@contextmanager
+def locked(name):
+	'''
+	Yields whether this process holds the lock name, taking it for the
+	duration of the block if nobody else has it
+	'''
+	if name in _heldLocks:
+		yield True
+		return
+
+	acquired = acquire_lock(name)
+	try:
+		yield acquired
+	finally:
+		if acquired:
+			release_lock(name)
+
+
+def spawn(lockName, configPath, argv):
+	'''
+	Run the command line with argv in a detached process unless another
+	process already holds lockName.  Returns True if a process was started.
+	'''
+	if is_locked(lockName):
+		BackgroundLogger.debug('%s already running in the background', lockName)
+		return False
+
+	args = [ sys.executable, '-m', __name__, lockName, configPath ] + list(argv)
+	options = {}
+	if os.name == 'nt':
+		options['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP \
+			| getattr(subprocess, 'DETACHED_PROCESS', 0x8)
+	else:
+		options['start_new_session'] = True
+
+	BackgroundLogger.debug('Spawning background process: %s', args)
+	subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL, close_fds=True, **options)
+	return True
+
+
+def main(lockName, configPath, argv):
+	with locked(lockName) as acquired:
+		if not acquired:
+			return
+
+		# Imported here so a lost race doesn't pay for loading the program
+		from qtimer.cmd_line import main as cmd_line_main
+		cmd_line_main(argv, configPath)
+
+
+if __name__ == '__main__':
+	# Go through the imported module, commands check its held locks
+	from qtimer import background
+	background.main(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -0,0 +1,54 @@
+# A thin client for qtimer.daemon.  This module must stay cheap to import,
+# the whole point is to skip loading the program on every call.
+
+import json
+import os
+import socket
+import sys
+
+from qtimer.env import SOCKET_PATH
+
+
+def connect(socketPath=SOCKET_PATH):
+	if not hasattr(socket, 'AF_UNIX'):
+		return None
+
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(socketPath)
+	except (FileNotFoundError, ConnectionRefusedError):
+		sock.close()
+		return None
+	return sock
+
+
+def main(argv=None, socketPath=SOCKET_PATH):
+	argv = sys.argv[1:] if argv is None else argv
+
+	sock = connect(socketPath)
+	if not sock:
+		# No daemon running, do the work ourselves
+		from qtimer.cmd_line import main as cmd_line_main
+		cmd_line_main(argv)
+		return 0
+
+	streams = { 'out': sys.stdout, 'err': sys.stderr }
+	request = { 'argv': argv, 'cwd': os.getcwd() }
+
+	# The daemon can't see our stdin, so send it along when a command reads it
+	if '-' in argv:
+		request['stdin'] = sys.stdin.read()
+	with sock, sock.makefile('rwb') as conn:
+		conn.write((json.dumps(request) + '\n').encode('utf-8'))
+		conn.flush()
+
+		for line in conn:
+			message = json.loads(line.decode('utf-8'))
+			if 'exit' in message:
+				return message['exit']
+			stream = streams[message['stream']]
+			stream.write(message['data'])
+			stream.flush()
+
+	# The daemon went away before telling us how the command ended
+	return 1
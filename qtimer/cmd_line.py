@@ -1,11 +1,11 @@
 # This is intended to be run as the main file in a command line
 
-from importlib import import_module
-from os import path, listdir
-
 import argparse
+import configparser
 import logging
+import sys
 
+from qtimer import manifest
 from qtimer.util import smart_truncate, LazyObject
 from qtimer.core import create_qtimer
 from qtimer.lib import terminalsize
@@ -18,25 +18,21 @@ OutputLogger = logging.getLogger('output')
 class QTimerCommandLine(LazyObject):
 
 	def __init__(self, core):
-		super(self, QTimerCommandLine).__init__({
+		super(QTimerCommandLine, self).__init__({
+			'manifest': self.loadManifest,
 			'commands': self.loadCommands,
 			'parser': self.loadParser,
 		})
 		self.core = core
+		self.subparsers = {}
+		self.withArguments = set()
 
-	def loadCommands(self):
-		commands = {}
-		commandPath = path.join(SCRIPT_ROOT, 'commands')
-
-		files = (path.splitext(item)[0] for item in listdir(commandPath)
-			if (not (item == '__init__.py' or item == 'command.py'))
-				and path.isfile(path.join(commandPath, item)))
+	def loadManifest(self):
+		return manifest.load(self._commandPackages())
 
-		for f in files:
-			key, command = self._importCommand(f)
-			commands[key] = command
-
-		return commands
+	def loadCommands(self):
+		# Filled in by getCommand as commands are used
+		return {}
 
 	def loadParser(self):
 		parser = argparse.ArgumentParser(prog=APP_NAME)
@@ -45,24 +41,49 @@ class QTimerCommandLine(LazyObject):
 
 		subparsers = parser.add_subparsers(title=strings['command_title'], dest='op')
 
-		for identifier, command in self.commands.items():
-			if hasattr(command, 'COMMAND_HELP'):
-				subparser = subparsers.add_parser(identifier, help=command.COMMAND_HELP)
+		# Arguments are only added once we know a command is being used
+		for identifier, entry in sorted(self.manifest.items()):
+			if entry['help']:
+				subparser = subparsers.add_parser(identifier, help=entry['help'])
 			else:
 				subparser = subparsers.add_parser(identifier)
-			command.addArguments(subparser)
+			self.subparsers[identifier] = subparser
 
 		return parser
 
 	def parseArgs(self, argsOverride=None):
-		args = self.parser.parse_args(argsOverride)
+		argv = sys.argv[1:] if argsOverride is None else argsOverride
+
+		# Top level options don't take values, so the first word is the command
+		identifier = next((arg for arg in argv if not arg.startswith('-')), None)
+		if identifier in self.manifest:
+			self.addArguments(identifier)
+
+		args = self.parser.parse_args(argv)
 		if not args.op:
 			self.parser.print_help()
 
 		return vars(args)
 
+	def addArguments(self, identifier):
+		# Building the parser is what creates the subparsers
+		self.parser
+		if identifier in self.withArguments:
+			return
+		self.getCommand(identifier).addArguments(self.subparsers[identifier])
+		self.withArguments.add(identifier)
+
+	def getCommand(self, identifier):
+		if identifier not in self.commands:
+			entry = self.manifest.get(identifier, None)
+			if not entry:
+				return None
+			self.commands[identifier] = manifest.import_command(
+				entry['module'], entry['class'])
+		return self.commands[identifier]
+
 	def executeCommand(self, args):
-		command = self.commands.get(args['op'], None)
+		command = self.getCommand(args['op'])
 		if not command:
 			raise RuntimeError('No command found matching ' + args['op'])
 		return command.runCommand(
@@ -96,20 +117,20 @@ class QTimerCommandLine(LazyObject):
 				items.append(item)
 			OutputLogger.info(formatStr % tuple(items))
 
-	def _importCommand(self, f):
-		# Predict the class name to be the TitleCase of the script mod
-		className = f.title().replace('_', '')
-		mod = import_module(COMMANDS_MOD % f)
-		command = getattr(mod, className)()
-
-		if not hasattr(command, 'COMMAND_IDENTIFIER'):
-			raise RuntimeError('Command %s must declare an ID' % (COMMANDS_MOD % f))
+	def _commandPackages(self):
+		# Read straight from the ini, loading the full config is slow
+		parser = configparser.ConfigParser()
+		parser.read(self.core.configPath)
+		extra = parser.get('commands', 'packages', fallback='')
+		return [ COMMANDS_PKG ] + [ pkg.strip() for pkg in extra.split(',') if pkg.strip() ]
 
-		return command.COMMAND_IDENTIFIER, command
 
-
-def main():
-	with create_qtimer(CONFIG_PATH) as core:
+def main(argv=None, configPath=CONFIG_PATH):
+	with create_qtimer(configPath) as core:
 		cmd_line = QTimerCommandLine(core)
-		args = cmd_line.parseArgs()
+		args = cmd_line.parseArgs(argv)
 		cmd_line.executeCommand(args)
+
+
+if __name__ == '__main__':
+	main()
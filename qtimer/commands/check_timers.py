@@ -0,0 +1,41 @@
+from qtimer.commands.command import Command
+from qtimer.model import Timer, refresh_summaries
+from qtimer.strings import strings
+from qtimer.util import autocommit
+
+import logging
+
+OutputLogger = logging.getLogger('output')
+
+# Summaries are rounded to the millisecond, so allow for that
+TOLERANCE = 0.001
+
+
+class CheckTimers(Command):
+
+	COMMAND_IDENTIFIER = 'check'
+	COMMAND_HELP = strings['command_check']
+
+	def runCommand(self, args, program, core):
+		with autocommit(core.session) as session:
+			before = self._summaries(session)
+			count = refresh_summaries(session)
+			after = self._summaries(session)
+
+		stale = [ timerId for timerId, summary in after.items()
+			if not self._same(before.get(timerId), summary) ]
+		OutputLogger.info(strings['check_result'], count, len(stale))
+
+		return stale
+
+	def _summaries(self, session):
+		q = session.query(Timer.id, Timer.first_start,
+			Timer.closed_seconds, Timer.open_start)
+		return dict((row[0], tuple(row[1:])) for row in q)
+
+	def _same(self, a, b):
+		if a is None:
+			return False
+		firstStart, closedSeconds, openStart = a
+		return firstStart == b[0] and openStart == b[2] \
+			and abs((closedSeconds or 0) - b[1]) < TOLERANCE
@@ -1,6 +1,6 @@
 from qtimer.util import parse_time, autocommit
 
-from qtimer.model import Timer
+from qtimer.model import Timer, Session, refresh_summaries
 
 from qtimer.commands.command import Command
 from qtimer.strings import strings
@@ -19,16 +19,20 @@ class EditTimer(Command):
 
 	def runCommand(self, args, program, core):
 		with autocommit(core.session) as session:
-			q = session.query(Timer).filter(Timer.id == args['id'])
-			values = {}
+			sessions = session.query(Session).filter(Session.timer_id == args['id'])
+
+			# A timer starts with its first session and ends with its last one
 			if args['start']:
-				values[Timer.start] = args['start']
+				first = sessions.order_by(Session.start).first()
+				first.start = args['start']
 			if args['end']:
-				values[Timer.end] = args['end']
+				last = sessions.order_by(Session.start.desc()).first()
+				last.end = args['end']
 			if args['ticket']:
-				values[Timer.ticket_id] = args['ticket']
+				session.query(Timer).filter(Timer.id == args['id'])\
+					.update({ Timer.ticket_id: args['ticket'] })
 
-			q.update(values)
+			refresh_summaries(session, [ args['id'] ])
 
 		args = program.parseArgs([ 'find', 'timers', '--id', str(args['id']) ])
 		return program.executeCommand(args)
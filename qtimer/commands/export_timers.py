@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from qtimer.commands.command import Command
+from qtimer.model import Timer, Session, Ticket, Project
+from qtimer.util import parse_date
+from qtimer.strings import strings
+
+import csv
+import json
+import sys
+
+# One row per session, timers with their ticket and project repeated.
+# qtimer.commands.import_timers reads the same fields.
+EXPORT_FIELDS = (
+	'timer_id', 'timer_name', 'posted', 'billable_status',
+	'project_id', 'project_name', 'ticket_id', 'ticket_name',
+	'session_id', 'start', 'end',
+)
+
+# How many rows are read from the database and written at a time
+CHUNK_SIZE = 1000
+
+
+class ExportTimers(Command):
+
+	COMMAND_IDENTIFIER = 'export'
+	COMMAND_HELP = strings['command_export']
+
+	def addArguments(self, parser):
+		parser.add_argument('-F', '--format', choices=('jsonl', 'csv'),
+			default='jsonl', help=strings['command_export_format'])
+		parser.add_argument('-o', '--output', help=strings['command_export_output'])
+		parser.add_argument('-f', '--from', dest='start', type=parse_date,
+			help=strings['command_export_from'])
+		parser.add_argument('-t', '--to', dest='end', type=parse_date,
+			help=strings['command_export_to'])
+
+		posted = parser.add_mutually_exclusive_group()
+		posted.add_argument('--posted', action='store_true', default=False,
+			help=strings['command_export_posted'])
+		posted.add_argument('--unposted', action='store_true', default=False,
+			help=strings['command_export_unposted'])
+
+	def runCommand(self, args, program, core):
+		stmt = self._select(args)
+
+		# Rows go straight from the cursor to the file, no ORM objects
+		connection = core.session.connection().execution_options(stream_results=True)
+		result = connection.execute(stmt)
+
+		out = open(args['output'], 'w', newline='') if args['output'] else sys.stdout
+		try:
+			write = self._writer(args['format'], out)
+			count = 0
+			while True:
+				rows = result.fetchmany(CHUNK_SIZE)
+				if not rows:
+					break
+				write(rows)
+				count += len(rows)
+		finally:
+			result.close()
+			if args['output']:
+				out.close()
+
+		return count
+
+	def _select(self, args):
+		sessions = Session.__table__
+		timers = Timer.__table__
+		tickets = Ticket.__table__
+		projects = Project.__table__
+
+		joined = sessions.join(timers, timers.c.id == sessions.c.timer_id)\
+			.outerjoin(tickets, tickets.c.id == timers.c.ticket_id)\
+			.outerjoin(projects, projects.c.id == tickets.c.project_id)
+
+		stmt = select([
+			timers.c.id, timers.c.name, timers.c.posted, timers.c.billable_status,
+			projects.c.id, projects.c.name, tickets.c.ticket_id, tickets.c.name,
+			sessions.c.id, sessions.c.start, sessions.c.end,
+		]).select_from(joined).order_by(timers.c.id, sessions.c.start)
+
+		if args['start']:
+			stmt = stmt.where(sessions.c.start >= args['start'])
+		if args['end']:
+			stmt = stmt.where(sessions.c.start < args['end'] + timedelta(days=1))
+		if args['posted']:
+			stmt = stmt.where(timers.c.posted == True)
+		if args['unposted']:
+			stmt = stmt.where(timers.c.posted == False)
+
+		return stmt
+
+	def _writer(self, fmt, out):
+		def record(row):
+			values = [ v.isoformat(' ') if isinstance(v, datetime) else v for v in row ]
+			return dict(zip(EXPORT_FIELDS, values))
+
+		if fmt == 'csv':
+			writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS)
+			writer.writeheader()
+			return lambda rows: writer.writerows(record(row) for row in rows)
+
+		def writeLines(rows):
+			out.write(''.join(json.dumps(record(row)) + '\n' for row in rows))
+		return writeLines
@@ -1,7 +1,11 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from qtimer.model import Timer, Session, Ticket, Project
+from sqlalchemy.orm import aliased
+
+from qtimer.model import Timer, Session, Ticket, Project, \
+    STATUS_ACTIVE, STATUS_IDLE, STATUS_POSTED
 from qtimer.commands.command import Command
+from qtimer.search import name_search
 from qtimer.util import format_time
 from qtimer.strings import strings
 
@@ -13,6 +17,9 @@ DISPLAYED_FIELDS = {
     'projects': ( 'id', 'name', ),
 }
 
+# How many rows are fetched from the database at a time
+FETCH_SIZE = 200
+
 DISPLAY_WEIGHTS = {
     'timers': (0.1, 0.18, 0.16, 0.1, 0.3, 0.12, 0.04),
     'tickets': (0.1, 0.7, 0.1, 0.1)
@@ -38,6 +45,10 @@ class FindObject(Command):
         common_find_parser.add_argument('-n', '--name',
             help=strings['command_find_name'])
         common_find_parser.add_argument('-i', '--id', help=strings['command_find_id'])
+        common_find_parser.add_argument('--limit', type=int,
+            help=strings['command_find_limit'])
+        common_find_parser.add_argument('--after-id', type=int,
+            help=strings['command_find_after_id'])
 
         subparser_find = parser.add_subparsers(dest='type',
             title='What type of object should we look for')
@@ -75,39 +86,53 @@ class FindObject(Command):
         q = sql.query(ormClass)
 
         if 'name' in args and args['name']:
-            q = q.filter(ormClass.name.like('%' + args['name'] + '%'))
+            q = name_search(q, sql, ormClass, args['name'], rank=True)
 
         if 'id' in args and args['id']:
             q = q.filter(ormClass.id == args['id'])
 
+        if 'after_id' in args and args['after_id']:
+            q = q.filter(ormClass.id > args['after_id'])
+
+        # Timers only reach a project through their ticket
+        if ormClass is Timer and (args.get('project') or args.get('ticket')):
+            q = q.join(Ticket)
+
         if 'project' in args and args['project']:
-            q = q.join(Project).filter(Project.name.like('%' + args['project'] + '%'))
+            q = name_search(q.join(Project), sql, Project, args['project'])
 
         if 'ticket' in args and args['ticket']:
-            q = q.join(Ticket).filter(Ticket.name.like('%' + args['ticket'] + '%'))
+            q = name_search(q, sql, Ticket, args['ticket'])
 
         if 'active' in args and args['active']:
-            q = q.join(Session).filter(Session.end == None)
+            q = q.filter(Timer.open_start != None)
 
         if 'inactive' in args and args['inactive']:
-            q = q.join(Session).filter(Session.end != None)
+            q = q.filter(Timer.sessions.any(Session.end != None))
 
-        # this is kinda a hack b/c we know that ormClass will be Timer
-        if 'with-ticket' in args and args['with-ticket']:
-            q = q.filter(ormClass.ticket.id != None)
+        if 'with_ticket' in args and args['with_ticket']:
+            q = q.filter(Timer.ticket_id != None)
 
-        # Filter by status if asked
-        # Problem: if the client assumes it's a query object
-        # and uses this, it will fail horribly
-        # TODO: figure out a way to do this in SQL?
+        # Filter by status if asked, Timer.status also works as SQL
         if 'status' in args and args['status']:
-            q = filter(lambda t: args['status'].lower() in t.status.lower(), q)
+            q = q.filter(Timer.status.like('%' + args['status'].lower() + '%'))
+
+        listing = self._listTimers(q) if ormClass is Timer else q
+
+        # Pages are keyed on id so the next one starts at --after-id
+        if args.get('limit') or args.get('after_id'):
+            listing = listing.order_by(None).order_by(ormClass.id)
+        if args.get('limit'):
+            listing = listing.limit(args['limit'])
+
+        # Rows are printed as they arrive instead of after loading them all
+        listing = listing.yield_per(FETCH_SIZE)
 
         # This determines the ordering of the tuple
         fieldNames = DISPLAYED_FIELDS.get(args['type'])
 
         mapFunc = lambda i: self._formatRow(i, fieldNames, core)
-        rows = map(mapFunc, q)
+        rows = map(mapFunc, listing)
 
         header = tuple([ s.replace('_', ' ').title() for s in fieldNames ])
         weights = DISPLAY_WEIGHTS.get(args['type'])
@@ -115,14 +140,38 @@ class FindObject(Command):
 
         return q
 
+    def _listTimers(self, q):
+        '''
+        Everything displayed about the timers matched by q, read from the
+        summary kept on each timer so no sessions have to be loaded
+        '''
+        TimerTicket = aliased(Ticket)
+
+        return q.outerjoin(TimerTicket, TimerTicket.id == Timer.ticket_id)\
+            .with_entities(
+                Timer.id, Timer.name, Timer.posted,
+                Timer.first_start, Timer.closed_seconds, Timer.open_start,
+                TimerTicket.id.label('ticket_id'),
+                TimerTicket.name.label('ticket_name'),
+            )
+
     def _formatRow(self, row, fieldNames, core):
-        items = vars(row)
-        if isinstance(row, Timer):
-            items['start'] = format_time(row.start)
-            items['duration'] = timedelta()
-            items['duration'] = core.roundTime(row.duration)
-            items['ticket'] = '%d: %s' % (row.ticket.id, row.ticket.name) \
-                if row.ticket else None
-            items['status'] = row.status.title()
+        if isinstance(row, (Ticket, Project)):
+            items = vars(row)
+        else:
+            items = dict(zip(row.keys(), row))
+            duration = timedelta(seconds=row.closed_seconds or 0)
+            if row.open_start:
+                duration += datetime.utcnow() - row.open_start
+            items['start'] = format_time(row.first_start) if row.first_start else None
+            items['duration'] = core.roundTime(duration)
+            items['ticket'] = '%d: %s' % (row.ticket_id, row.ticket_name) \
+                if row.ticket_id else None
+            items['status'] = self._timerStatus(row).title()
 
         return tuple([ items[key] for key in fieldNames ])
+
+    def _timerStatus(self, row):
+        if row.posted:
+            return STATUS_POSTED
+        return STATUS_ACTIVE if row.open_start else STATUS_IDLE
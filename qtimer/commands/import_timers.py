@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func
+
+from qtimer.commands.command import Command
+from qtimer.model import Timer, Session, Ticket
+from qtimer.util import autocommit, chunked
+from qtimer.strings import strings
+
+import csv
+import json
+import logging
+import sys
+
+OutputLogger = logging.getLogger('output')
+
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', )
+
+TRUE_VALUES = ('1', 'true', 'yes', )
+
+
+class ImportConflict(Exception):
+	pass
+
+
+class ImportTimers(Command):
+
+	COMMAND_IDENTIFIER = 'import'
+	COMMAND_HELP = strings['command_import']
+
+	def addArguments(self, parser):
+		parser.add_argument('file', help=strings['command_import_file'])
+		parser.add_argument('-F', '--format', choices=('jsonl', 'csv'),
+			help=strings['command_import_format'])
+		parser.add_argument('--dry-run', action='store_true', default=False,
+			help=strings['command_import_dry_run'])
+		parser.add_argument('--batch-size', type=int, default=5000,
+			help=strings['command_import_batch'])
+
+	def runCommand(self, args, program, core):
+		fmt = args['format'] or ('csv' if args['file'].endswith('.csv') else 'jsonl')
+		source = sys.stdin if args['file'] == '-' else open(args['file'], newline='')
+		conflicts = []
+		try:
+			timers = self._readTimers(self._records(fmt, source, conflicts), conflicts)
+		finally:
+			if source is not sys.stdin:
+				source.close()
+
+		self._mapTickets(core.session, timers, conflicts)
+		self._findExisting(core.session, timers, conflicts)
+
+		# Lines which could not be read belong to no timer
+		rejected = set(key for line, key, message in conflicts if key)
+		accepted = [ timer for key, timer in timers.items() if key not in rejected ]
+		sessionCount = sum(len(timer['sessions']) for timer in accepted)
+
+		if conflicts:
+			program.outputRows(rows=sorted(conflicts),
+				header=strings['conflicts_header'], weights=(0.1, 0.2, 0.7))
+
+		if args['dry_run']:
+			OutputLogger.info(strings['import_dry_run'],
+				len(accepted), sessionCount, len(rejected))
+			return accepted
+
+		for batch in chunked(accepted, args['batch_size']):
+			with autocommit(core.session) as session:
+				self._insert(session, batch)
+
+		OutputLogger.info(strings['import_result'],
+			len(accepted), sessionCount, len(rejected))
+		return accepted
+
+	def _records(self, fmt, source, conflicts):
+		''' Yields (line number, record) for every row of the file '''
+		if fmt == 'csv':
+			reader = csv.DictReader(source)
+			for record in reader:
+				yield reader.line_num, record
+			return
+
+		for line, text in enumerate(source, 1):
+			if not text.strip():
+				continue
+			try:
+				record = json.loads(text)
+			except ValueError as e:
+				conflicts.append((line, '', 'Invalid JSON: %s' % e))
+				continue
+			if not isinstance(record, dict):
+				conflicts.append((line, '', 'Not a JSON object'))
+				continue
+			yield line, record
+
+	def _readTimers(self, records, conflicts):
+		''' Group sessions by their timer and check everything but tickets '''
+		timers = OrderedDict()
+		for line, record in records:
+			key = str(record.get('timer_id') or '')
+			try:
+				if not key:
+					raise ImportConflict('Missing timer_id')
+
+				start = parse_timestamp(record.get('start'))
+				end = parse_timestamp(record.get('end'))
+				if not start:
+					raise ImportConflict('Missing session start')
+				if end and end < start:
+					raise ImportConflict('Session ends before it starts')
+
+				timer = timers.get(key)
+				if not timer:
+					if not record.get('timer_name'):
+						raise ImportConflict('Missing timer_name')
+					timer = timers[key] = {
+						'line': line,
+						'name': record['timer_name'],
+						'posted': parse_bool(record.get('posted')),
+						'billable_status': parse_int(record.get('billable_status')),
+						'project_id': parse_int(record.get('project_id')),
+						'ticket_id': parse_int(record.get('ticket_id')),
+						'sessions': [],
+					}
+
+				if not end and any(not s[1] for s in timer['sessions']):
+					raise ImportConflict('More than one running session')
+				timer['sessions'].append((start, end))
+			except (ImportConflict, ValueError) as e:
+				conflicts.append((line, key, str(e)))
+
+		return timers
+
+	def _mapTickets(self, session, timers, conflicts):
+		''' Find the local ticket of every timer by its remote ticket id '''
+		byProject = {}
+		byTicket = {}
+		for ticketPk, ticketId, projectId in session.query(
+				Ticket.id, Ticket.ticket_id, Ticket.project_id):
+			byProject[(projectId, ticketId)] = ticketPk
+			byTicket.setdefault(ticketId, []).append(ticketPk)
+
+		for key, timer in timers.items():
+			ticketId = timer['ticket_id']
+			timer['ticket'] = None
+			if ticketId is None:
+				continue
+
+			if timer['project_id'] is not None:
+				timer['ticket'] = byProject.get((timer['project_id'], ticketId))
+			elif len(byTicket.get(ticketId, ())) == 1:
+				timer['ticket'] = byTicket[ticketId][0]
+			elif byTicket.get(ticketId):
+				conflicts.append((timer['line'], key,
+					'Ticket %d is in more than one project' % ticketId))
+				continue
+
+			if timer['ticket'] is None:
+				conflicts.append((timer['line'], key, 'Unknown ticket %d' % ticketId))
+
+	def _findExisting(self, session, timers, conflicts):
+		''' Importing the same file twice must not count the time twice '''
+		starts = [ start for timer in timers.values() for start, end in timer['sessions'] ]
+		if not starts:
+			return
+
+		q = session.query(Timer.name, Timer.ticket_id, Session.start)\
+			.join(Session, Session.timer_id == Timer.id)\
+			.filter(Session.start.between(min(starts), max(starts)))
+		existing = set(tuple(row) for row in q)
+
+		for key, timer in timers.items():
+			if any((timer['name'], timer['ticket'], start) in existing
+					for start, end in timer['sessions']):
+				conflicts.append((timer['line'], key, 'Timer already exists'))
+
+	def _insert(self, session, batch):
+		# Ids are handed out here so sessions can point at their timers
+		# without reading every new timer back
+		nextId = (session.query(func.max(Timer.id)).scalar() or 0) + 1
+
+		timerRows = []
+		sessionRows = []
+		for timerPk, timer in enumerate(batch, nextId):
+			sessions = timer['sessions']
+			closed = sum((end - start).total_seconds() for start, end in sessions if end)
+			running = [ start for start, end in sessions if not end ]
+			timerRows.append({
+				'id': timerPk,
+				'name': timer['name'],
+				'posted': timer['posted'],
+				'billable_status': timer['billable_status'],
+				'ticket_id': timer['ticket'],
+				'first_start': min(start for start, end in sessions),
+				'closed_seconds': closed,
+				'open_start': running[0] if running else None,
+			})
+			sessionRows.extend({ 'timer_id': timerPk, 'start': start, 'end': end }
+				for start, end in sessions)
+
+		session.execute(Timer.__table__.insert(), timerRows)
+		session.execute(Session.__table__.insert(), sessionRows)
+
+
+def parse_timestamp(value):
+	if not value:
+		return None
+	value = value.replace('T', ' ')
+	for fmt in TIME_FORMATS:
+		try:
+			return datetime.strptime(value, fmt)
+		except ValueError:
+			pass
+	raise ImportConflict('Could not read time %s' % value)
+
+
+def parse_bool(value):
+	if isinstance(value, bool):
+		return value
+	return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_int(value):
+	if value is None or value == '':
+		return None
+	return int(value)
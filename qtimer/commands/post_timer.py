@@ -1,11 +1,28 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm import joinedload
+
 from qtimer.commands.command import Command
-from qtimer.util import autocommit
-from qtimer.model import Timer
+from qtimer.plugins.prototype import TimeEntry
+from qtimer.plugins.transport import is_transient, outcome_unknown
+from qtimer.util import autocommit, retry
+from qtimer.model import Timer, Ticket, PostIntent, post_intent_timers, \
+	INTENT_PENDING, INTENT_SENDING, INTENT_SENT, INTENT_UNKNOWN, INTENT_FAILED
 from qtimer.strings import strings
+from qtimer import background
 
 import logging
+import socket
 
 LOGGER = logging.getLogger(__name__)
+OutputLogger = logging.getLogger('output')
+
+# Lock held by whoever is sending queued posts
+FLUSH_LOCK = 'post'
 
 
 class PostTimer(Command):
@@ -18,31 +35,281 @@ class PostTimer(Command):
 		parser.add_argument('-n', '--name')
 		parser.add_argument('-p', '--project')
 		parser.add_argument('-t', '--ticket')
+		parser.add_argument('-a', '--aggregate', action='store_true', default=False,
+			help=strings['command_post_aggregate'])
+		parser.add_argument('--flush', action='store_true', default=False,
+			help=strings['command_post_flush'])
+		parser.add_argument('--unknown', action='store_true', default=False,
+			help=strings['command_post_unknown'])
+		parser.add_argument('--failed', action='store_true', default=False,
+			help=strings['command_post_failed'])
+		parser.add_argument('--mark-sent', nargs='+', type=int, metavar='ID',
+			help=strings['command_post_mark_sent'])
+		parser.add_argument('--requeue', nargs='+', type=int, metavar='ID',
+			help=strings['command_post_requeue'])
+		parser.add_argument('--cancel', nargs='+', type=int, metavar='ID',
+			help=strings['command_post_cancel'])
 
 	def runCommand(self, args, program, core):
-		args = [
-			'find', 'timers', '--inactive', '--with-ticket',
-			'-i', args['id'], '-n', args['name'],
-			'-p', args['project'], '-t', args['ticket']
-		]
-		args = program.parseArgs(args)
-		timers = program.executeCommand(args)
-
-		updatedTimers = []
-		for timer in timers:
-			try:
-				core.plugin.postTimer(
-					projectId=timer.ticket.project.id,
-					ticketId=timer.ticket.ticket_id,
-					data=timer
-				)
-				updatedTimers.append(timer.id)
-			except:
-				LOGGER.exception('Could not post timer.')
-
-		if not updatedTimers:
+		if args['flush']:
+			return self.flush(program, core)
+		if args['unknown']:
+			return self.listState(program, core, INTENT_UNKNOWN, strings['post_unknown'])
+		if args['failed']:
+			return self.listState(program, core, INTENT_FAILED, strings['post_failed'])
+		if args['mark_sent']:
+			return self.resolve(core, args['mark_sent'], INTENT_SENT, (INTENT_UNKNOWN,))
+		if args['requeue']:
+			return self.resolve(core, args['requeue'], INTENT_PENDING,
+				(INTENT_UNKNOWN, INTENT_FAILED))
+		if args['cancel']:
+			return self.cancel(core, args['cancel'])
+
+		queued = self.enqueue(args, program, core)
+		if not queued:
 			return
 
-		values = { 'posted': True, }
+		OutputLogger.info(strings['post_queued'], queued)
+		inBackground = getattr(core.config.account, 'post_in_background', 'true')
+		if inBackground.lower() == 'true':
+			background.spawn(FLUSH_LOCK, core.configPath, ['post', '--flush'])
+		else:
+			return self.flush(program, core)
+
+	def enqueue(self, args, program, core):
+		''' Add a post intent for every timer to post, returns how many '''
+		findArgs = [ 'find', 'timers', '--inactive', '--with-ticket', '-s', 'idle' ]
+		for option in ('id', 'name', 'project', 'ticket'):
+			if args[option]:
+				findArgs += [ '--' + option, args[option] ]
+		findArgs = program.parseArgs(findArgs)
+		timers = program.executeCommand(findArgs)
+
+		timers = timers.filter(~Timer.intents.any(PostIntent.state != INTENT_SENT))\
+			.options(joinedload(Timer.ticket).joinedload(Ticket.project))\
+			.order_by(Timer.first_start).all()
+
+		aggregate = args['aggregate'] or \
+			getattr(core.config.account, 'post_aggregate', 'false').lower() == 'true'
+		groups = self._group(timers) if aggregate else [ [ timer ] for timer in timers ]
+
+		with autocommit(core.session) as session:
+			for group in groups:
+				session.add(PostIntent(
+					idempotency_key=uuid4().hex,
+					project_id=group[0].ticket.project.id,
+					ticket_id=group[0].ticket.ticket_id,
+					timers=group,
+				))
+
+		return len(timers)
+
+	def _group(self, timers):
+		''' Timers of the same ticket, local day and billable status together '''
+		groups = OrderedDict()
+		for timer in timers:
+			key = (timer.ticket.project.id, timer.ticket.ticket_id,
+				timer.day, timer.billable_status)
+			groups.setdefault(key, []).append(timer)
+		return list(groups.values())
+
+	def listState(self, program, core, state, result):
+		intents = core.session.query(PostIntent)\
+			.filter(PostIntent.state == state)\
+			.options(joinedload(PostIntent.timers))\
+			.order_by(PostIntent.id).all()
+		rows = [ (intent.id, ', '.join(timer.name for timer in intent.timers),
+			result % intent.last_error) for intent in intents ]
+		program.outputRows(rows=rows, header=strings['post_header'],
+			weights=(0.1, 0.4, 0.5))
+		return intents
+
+	def resolve(self, core, intentIds, state, fromStates):
+		''' Settle posts which need the user once they checked the remote '''
+		with autocommit(core.session) as session:
+			resolved = self._inStates(session, intentIds, fromStates)
+			if resolved:
+				self._setState(session, resolved, state)
+
+		OutputLogger.info(strings['post_resolved'], len(resolved))
+		return resolved
+
+	def cancel(self, core, intentIds):
+		''' Drop posts which aren't being sent, freeing their timers '''
+		with autocommit(core.session) as session:
+			cancelled = self._inStates(session, intentIds,
+				(INTENT_PENDING, INTENT_UNKNOWN, INTENT_FAILED))
+			if cancelled:
+				session.execute(post_intent_timers.delete()\
+					.where(post_intent_timers.c.intent_id.in_(cancelled)))
+				session.query(PostIntent).filter(PostIntent.id.in_(cancelled))\
+					.delete(synchronize_session=False)
+
+		OutputLogger.info(strings['post_cancelled'], len(cancelled))
+		return cancelled
+
+	def _inStates(self, session, intentIds, states):
+		intents = session.query(PostIntent.id)\
+			.filter(PostIntent.id.in_(intentIds))\
+			.filter(PostIntent.state.in_(states))
+		return [ row[0] for row in intents ]
+
+	def flush(self, program, core):
+		''' Send every pending post intent to the remote source '''
+		with background.locked(FLUSH_LOCK) as acquired:
+			if not acquired:
+				OutputLogger.info(strings['post_busy'])
+				return
+			return self._flush(program, core)
+
+	def _flush(self, program, core):
+		idempotent = getattr(core.plugin, 'idempotentPosts', False)
+
 		with autocommit(core.session) as session:
-			session.query(Timer).filter(Timer.id.in_(updatedTimers)).update(values)
+			# We hold the lock, so these are left over from a flush which died
+			# after sending and before it could write down what happened
+			interrupted = [ row[0] for row in session.query(PostIntent.id)
+				.filter(PostIntent.state == INTENT_SENDING) ]
+			if interrupted:
+				self._setState(session, interrupted,
+					INTENT_PENDING if idempotent else INTENT_UNKNOWN)
+				session.query(PostIntent).filter(PostIntent.id.in_(interrupted))\
+					.update({ PostIntent.last_error: strings['post_interrupted'] },
+						synchronize_session=False)
+
+			session.query(PostIntent).filter(PostIntent.state == INTENT_PENDING)\
+				.update({ PostIntent.state: INTENT_SENDING }, synchronize_session=False)
+
+		# Everything the plugin reads is loaded now, workers can't use the session
+		intents = core.session.query(PostIntent)\
+			.filter(PostIntent.state == INTENT_SENDING)\
+			.options(joinedload(PostIntent.timers))\
+			.order_by(PostIntent.id).all()
+
+		if intents:
+			results = self._postAll(core, intents)
+			self._record(program, core, intents, results, idempotent)
+		else:
+			results = {}
+
+		for state, message in ((INTENT_UNKNOWN, 'post_check_remote'),
+				(INTENT_FAILED, 'post_check_failed')):
+			count = core.session.query(PostIntent)\
+				.filter(PostIntent.state == state).count()
+			if count:
+				OutputLogger.warning(strings[message], count)
+
+		return results
+
+	def _record(self, program, core, intents, results, idempotent):
+		''' Write down what became of every intent that was sent '''
+		# Without a key the remote honours, a post which may have arrived
+		# can't be sent again without maybe recording the time twice
+		isUnknown = lambda e: outcome_unknown(e) and not idempotent
+
+		rows = []
+		sent, unknown, failed, refused = [], [], [], []
+		for intent in intents:
+			error = results[intent.id]
+			if error is None:
+				sent.append(intent.id)
+				result = strings['post_ok']
+			elif isUnknown(error):
+				unknown.append(intent.id)
+				result = strings['post_unknown'] % error
+			elif not is_transient(error, idempotent):
+				refused.append(intent.id)
+				result = strings['post_failed'] % error
+			else:
+				failed.append(intent.id)
+				result = strings['post_failed'] % error
+			rows.append((intent.id, ', '.join(timer.name for timer in intent.timers), result))
+
+		program.outputRows(rows=rows, header=strings['post_header'],
+			weights=(0.1, 0.4, 0.5))
+
+		errors = [ { 'b_id': intentId, 'b_error': str(results[intentId]) }
+			for intentId in unknown + failed + refused ]
+
+		with autocommit(core.session) as session:
+			session.query(PostIntent).filter(PostIntent.id.in_(results.keys()))\
+				.update({ PostIntent.attempts: PostIntent.attempts + 1 },
+					synchronize_session=False)
+
+			# Only what the remote confirmed counts as posted, posts which only
+			# hit a passing problem are tried again on the next flush
+			for ids, state in ((sent, INTENT_SENT), (unknown, INTENT_UNKNOWN),
+					(failed, INTENT_PENDING), (refused, INTENT_FAILED)):
+				if ids:
+					self._setState(session, ids, state)
+
+			if errors:
+				table = PostIntent.__table__
+				session.execute(table.update()\
+					.where(table.c.id == bindparam('b_id'))\
+					.values(last_error=bindparam('b_error')), errors)
+
+	def _setState(self, session, intentIds, state):
+		session.query(PostIntent).filter(PostIntent.id.in_(intentIds))\
+			.update({ PostIntent.state: state }, synchronize_session=False)
+
+		if state == INTENT_SENT:
+			sentTimers = session.query(post_intent_timers.c.timer_id)\
+				.filter(post_intent_timers.c.intent_id.in_(intentIds))
+			session.query(Timer).filter(Timer.id.in_(sentTimers.subquery()))\
+				.update({ Timer.posted: True }, synchronize_session=False)
+
+	def _postAll(self, core, intents):
+		''' Returns a dict of intent id to None if posted or the error if not '''
+		account = core.config.account
+		workers = int(getattr(account, 'post_workers', 4))
+		timeout = float(getattr(account, 'post_timeout', 30))
+		retries = int(getattr(account, 'post_retries', 3))
+		backoff = float(getattr(account, 'post_backoff', 1))
+		plugin = core.plugin
+
+		# Only plugins whose remote ignores a repeated idempotency key can
+		# send a post again when it isn't known whether the first one arrived
+		transient = lambda e: is_transient(e,
+			idempotent=getattr(plugin, 'idempotentPosts', False))
+
+		def post(intent):
+			data = self._data(core, intent)
+			send = lambda: plugin.postTimer(
+				projectId=intent.project_id,
+				ticketId=intent.ticket_id,
+				data=data,
+				idempotencyKey=intent.idempotency_key,
+			)
+			try:
+				retry(send, retries, backoff, transient)
+				return None
+			except Exception as e:
+				LOGGER.exception('Could not post intent %d.', intent.id)
+				return e
+
+		if getattr(plugin, 'usesSharedTransport', False):
+			# The transport applies its own timeout to every request
+			return self._postWith(post, intents, workers)
+
+		# Other plugins don't take a timeout, but every socket they open will.
+		# This is process wide, so only do it when nothing else uses it
+		previousTimeout = socket.getdefaulttimeout()
+		socket.setdefaulttimeout(timeout)
+		try:
+			return self._postWith(post, intents, workers)
+		finally:
+			socket.setdefaulttimeout(previousTimeout)
+
+	def _postWith(self, post, intents, workers):
+		with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+			return dict(zip([ intent.id for intent in intents ],
+				executor.map(post, intents)))
+
+	def _data(self, core, intent):
+		if len(intent.timers) == 1:
+			return intent.timers[0]
+
+		duration = sum((core.roundTime(timer.duration) for timer in intent.timers),
+			timedelta())
+		return TimeEntry(intent.timers, duration)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from qtimer.commands.command import Command
+from qtimer.model import Timer, Session, Ticket, Project, BILLABLE_STATUSES
+from qtimer.util import parse_date
+from qtimer.strings import strings
+
+BILLABLE_NAMES = dict((value, key) for key, value in BILLABLE_STATUSES.items())
+
+# Sessions are stored in UTC but people think in local days and weeks
+GROUPS = {
+	'day': lambda: [ func.date(Session.start, 'localtime') ],
+	'week': lambda: [ func.strftime('%Y-W%W', Session.start, 'localtime') ],
+	'project': lambda: [ Project.id, Project.name ],
+	'ticket': lambda: [ Ticket.id, Ticket.name ],
+	'billable': lambda: [ Timer.billable_status ],
+}
+
+
+class ReportTimers(Command):
+
+	COMMAND_IDENTIFIER = 'report'
+	COMMAND_HELP = strings['command_report']
+
+	def addArguments(self, parser):
+		parser.add_argument('-f', '--from', dest='start', type=parse_date,
+			help=strings['command_report_from'])
+		parser.add_argument('-t', '--to', dest='end', type=parse_date,
+			help=strings['command_report_to'])
+		parser.add_argument('-b', '--by', nargs='+', default=['day'],
+			choices=sorted(GROUPS.keys()), help=strings['command_report_by'])
+
+	def runCommand(self, args, program, core):
+		columns = [ GROUPS[group]() for group in args['by'] ]
+		groupBy = [ c for groupColumns in columns for c in groupColumns ]
+
+		# Sessions still running count up to now
+		end = func.coalesce(Session.end, datetime.utcnow())
+		# julianday() is a float, round away the error before it becomes a second
+		seconds = func.round(func.sum(func.julianday(end) - func.julianday(Session.start)) * 86400, 3)
+
+		q = core.session.query(*(groupBy + [ seconds ]))\
+			.select_from(Session)\
+			.join(Timer, Timer.id == Session.timer_id)\
+			.outerjoin(Ticket, Ticket.id == Timer.ticket_id)\
+			.outerjoin(Project, Project.id == Ticket.project_id)\
+			.group_by(*groupBy).order_by(*groupBy)
+
+		if args['start']:
+			q = q.filter(Session.start >= args['start'])
+		if args['end']:
+			q = q.filter(Session.start < args['end'] + timedelta(days=1))
+
+		total = timedelta()
+		rows = []
+		for row in q:
+			duration = core.roundTime(timedelta(seconds=row[-1] or 0))
+			total += duration
+			rows.append(self._formatRow(args['by'], row) + (duration, ))
+
+		header = tuple(group.title() for group in args['by']) + ('Duration', )
+		footer = (strings['report_total'], ) + ('', ) * (len(header) - 2) + (total, )
+		program.outputRows(rows=rows + [ footer ], header=header)
+
+		return rows
+
+	def _formatRow(self, groups, row):
+		items = []
+		i = 0
+		for group in groups:
+			if group in ('project', 'ticket'):
+				itemId, name = row[i], row[i + 1]
+				items.append('%d: %s' % (itemId, name) if itemId else None)
+				i += 2
+			elif group == 'billable':
+				items.append(BILLABLE_NAMES.get(row[i], row[i]))
+				i += 1
+			else:
+				items.append(row[i])
+				i += 1
+		return tuple(items)
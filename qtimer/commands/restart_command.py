@@ -1,5 +1,5 @@
 from qtimer.commands.command import Command
-from qtimer.model import Session, Timer
+from qtimer.model import Session, Timer, refresh_summaries
 from qtimer.util import autocommit
 from qtimer.strings import strings
 
@@ -24,9 +24,13 @@ class RestartCommand(Command):
 		program to run database commands, and access global data
 		'''
 		timer = core.session.query(Timer).filter(Timer.id == args['id']).one()
-		session = Session(timer_id=timer.id, start=core.roundTime(datetime.utcnow()))
-		with autocommit(core.session) as sql:
-			sql.add(session)
+
+		# A second open session would count the same time twice
+		if not timer.open_start:
+			session = Session(timer_id=timer.id, start=core.roundTime(datetime.utcnow()))
+			with autocommit(core.session) as sql:
+				sql.add(session)
+				refresh_summaries(sql, [ timer.id ])
 
 		args = program.parseArgs([ 'find', 'timers', '--id', str(args['id']) ])
 		return program.executeCommand(args)
@@ -16,8 +16,10 @@ class StartTimer(Command):
 		parser.add_argument('-t', '--ticket', type=int, help=strings['command_start_group'])
 
 	def runCommand(self, args, program, core):
-		session = Session(start=core.roundTime(datetime.utcnow()))
-		timer = Timer(name=args['name'], ticket_id=args['ticket'], sessions=[session])
+		start = core.roundTime(datetime.utcnow())
+		session = Session(start=start)
+		timer = Timer(name=args['name'], ticket_id=args['ticket'], sessions=[session],
+			first_start=start, closed_seconds=0, open_start=start)
 		with autocommit(core.session) as sql:
 			sql.add(timer)
 
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from qtimer.commands.command import Command
-from qtimer.model import Session
+from qtimer.model import Session, refresh_summaries
 from qtimer.strings import strings
 from qtimer.util import autocommit
 
@@ -22,6 +22,7 @@ class StopTimer(Command):
 		with autocommit(core.session) as session:
 			session.query(Session).filter(Session.timer_id == args['id'])\
 				.filter(Session.end == None).update(values)
+			refresh_summaries(session, [ args['id'] ])
 
 		args = program.parseArgs([ 'find', 'timers', '--id', str(args['id']) ])
 		return program.executeCommand(args)
@@ -1,32 +1,46 @@
 # Common core shared by the command line and the gui
 
 # System imports
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 from importlib import import_module
 from os import makedirs, path
 
+import configparser
 import logging
+import queue
 
 import logging.config
 import logging.handlers
 
-# SQLALchemy
-from sqlalchemy.engine import Engine
-from sqlalchemy import event
-import sqlalchemy as sa
-import alembic.command
-
 # Custom
-from qtimer.model import Ticket, Project, PersistentVar
-from qtimer.util import autocommit, LazyObject
+from qtimer.util import autocommit, chunked, schema_fingerprint, LazyObject
 from qtimer.strings import strings
-from qtimer.config import Config
 from qtimer.env import *
+from qtimer import background
+
+# SQLAlchemy, alembic and qtimer.model take longer to import than most
+# commands take to run, so they are only imported once the database is used
+
+# This is what we use for writing to the database, see sql_session()
+SQLSession = None
+
+# Columns compared against the remote source to decide if a row changed
+SYNCED_FIELDS = {
+	'Project': ('name', ),
+	'Ticket': ('name', 'ticket_id', 'project_id', ),
+}
+
+# Remembers which projects an unfinished sync already wrote
+SYNC_PROGRESS = 'internal.syncProgress'
 
+# Lock held by whoever is syncing with the remote source
+REFRESH_LOCK = 'refresh'
 
-# This is what we use for writing to the database
-SQLSession = sa.orm.sessionmaker()
+# SQLite refuses statements with more bound parameters than this
+SQL_MAX_VARIABLES = 900
 
 CoreLogger = logging.getLogger(__name__)
 
@@ -34,7 +48,7 @@ CoreLogger = logging.getLogger(__name__)
 class QTimerCore(LazyObject):
 
 	def __init__(self, configPath):
-		super(self, QTimerCore).__init__({
+		super(QTimerCore, self).__init__({
 			'lastSynced': self.loadLastSynced,
 			'session': self.loadSession,
 			'plugin': self.loadPlugin,
@@ -43,33 +57,57 @@ class QTimerCore(LazyObject):
 		self.configPath = configPath
 
 	def loadLastSynced(self):
+		from qtimer.model import PersistentVar
+
 		q = self.session.query(PersistentVar)\
 			.filter(PersistentVar.name.like('internal.lastSynced'))
 		try:
 			lastSynced = q.one().value
-			CoreLogger.debug('lastSynced: %s, now: %s, delta: %s', lastSynced, datetime.utcnow(), datetime.utcnow() - self._lastSynced)
+			CoreLogger.debug('lastSynced: %s, now: %s, delta: %s', lastSynced, datetime.utcnow(), datetime.utcnow() - lastSynced)
 			return lastSynced
 		except BaseException as e:
 			CoreLogger.warn('Encountered exception: %s', repr(e))
 			pass
 
 	def loadSession(self):
+		from sqlalchemy import event
+		import sqlalchemy as sa
+
 		if not path.exists(DATA_DIR):
 			makedirs(DATA_DIR)
 
-		# This also has the side-effect of initializing the database
-		alembic.command.upgrade(self.config, "head")
-
 		CoreLogger.debug('sqlalchemy_url: %s', self.config.alembic.sqlalchemy_url)
 
 		self.engine = sa.create_engine(
 			self.config.alembic.sqlalchemy_url,
 			encoding="utf-8", echo=False
 		)
+		event.listen(self.engine, 'connect', set_sqlite_pragma)
+
+		# This also has the side-effect of initializing the database
+		self.upgradeSchema()
 
-		SQLSession.configure(bind=self.engine)
+		sessionmaker = sql_session()
+		sessionmaker.configure(bind=self.engine)
 
-		return SQLSession()
+		return sessionmaker()
+
+	def upgradeSchema(self):
+		# SQLite lets us stamp the database with an integer, so remember which
+		# set of migrations was applied and skip loading alembic when it matches
+		fingerprint = schema_fingerprint(self.config.alembic.script_location)
+		isSqlite = self.engine.dialect.name == 'sqlite'
+		if isSqlite:
+			version = self.engine.execute('PRAGMA user_version').scalar()
+			if version == fingerprint:
+				return
+			CoreLogger.debug('Schema stamp %s does not match %s', version, fingerprint)
+
+		import alembic.command
+		alembic.command.upgrade(self.config, "head")
+
+		if isSqlite:
+			self.engine.execute('PRAGMA user_version = %d' % fingerprint)
 
 	def loadPlugin(self):
 		url = self.config.account.url
@@ -80,55 +118,313 @@ class QTimerCore(LazyObject):
 		if not accountType:
 			raise RuntimeError(strings['bad_config'])
 
+		from qtimer.plugins.transport import shared_transport, ResponseCache
+		maxPerHost = int(getattr(self.config.account, 'http_max_per_host', 4))
+		transport = shared_transport()
+		transport.configure(
+			timeout=float(getattr(self.config.account, 'http_timeout', 30)),
+			maxPerHost=maxPerHost,
+		)
+
+		useCache = getattr(self.config.account, 'http_cache', 'true')
+		transport.cache = ResponseCache() if useCache.lower() == 'true' else None
+
 		mod = import_module(PLUGIN_MOD % accountType)
-		return mod.load_qtimer_plugin(url, token)
+		plugin = mod.load_qtimer_plugin(url, token)
+
+		# Every call to the remote, whichever command makes it, shares one limit
+		from qtimer.plugins.throttle import ThrottledPlugin
+		return ThrottledPlugin(plugin,
+			rate=float(getattr(self.config.account, 'rate_limit', 0)),
+			burst=int(getattr(self.config.account, 'rate_burst', 1)),
+			# More calls than the pool has connections would only queue in it
+			maxConcurrency=maxPerHost,
+			retries=int(getattr(self.config.account, 'throttle_retries', 3)),
+		)
 
 	def loadConfig(self):
+		from qtimer.config import Config
 		return Config(self.configPath)
 
 	def syncConditionally(self):
 		mins = int(self.config.account.cache_lifetime)
 		lifetime = timedelta(minutes=mins)
 		doSync = not self.lastSynced or (datetime.utcnow() - self.lastSynced) > lifetime
-		if doSync:
+		if not doSync:
+			return
+
+		# An empty cache can't answer anything, so the first sync always blocks
+		refreshLater = getattr(self.config.account, 'background_refresh', 'false')
+		if self.lastSynced and refreshLater.lower() == 'true':
+			CoreLogger.debug('Serving stale cache, refreshing in the background')
+			background.spawn(REFRESH_LOCK, self.configPath, ['refresh'])
+		else:
 			self.sync()
 
 	def sync(self):
+		# Two syncs at once would only wait on each other's writes and fail
+		with background.locked(REFRESH_LOCK) as acquired:
+			if not acquired:
+				CoreLogger.info(strings['refresh_busy'])
+				return
+			self._sync()
+
+	def _sync(self):
+		from qtimer.model import Project, PersistentVar
+
 		accountType = self.config.account.type
 		accountUrl = self.config.account.url
 
 		CoreLogger.info(strings['old_data'], accountType, accountUrl)
 
-		self.session.execute('PRAGMA foreign_keys=OFF')
-
-		# Prevent exceptions from destroying our foreign key support
 		try:
+			# Loading the plugin is what sets up the transport and its cache
+			plugin = self.plugin
+			cache = self._loadResponseCache()
+			progress = self._loadSyncProgress()
+			resumed = bool(progress['done'])
+			if resumed:
+				CoreLogger.debug('Resuming sync, %d projects already done',
+					len(progress['done']))
+
+			# Talk to the remote before opening a transaction, the network is slow
+			CoreLogger.debug('Getting list of projects from remote')
+			projects = [ project for page in self._pages(plugin.pageProjects)
+				for project in page ]
+
+			# Tickets refer to projects, so projects go in first
 			with autocommit(self.session) as session:
-				# Truncate tables for new data, this is faster than merging
-				session.query(Project).delete()
-				session.query(Ticket).delete()
-				CoreLogger.debug('Getting list of projects from remote')
-				projects = self.plugin.listProjects()
-				for project in projects:
-					session.add(project)
-					CoreLogger.debug("Getting list of tickets for pid '%s' from remote", project.id)
-					tickets = self.plugin.listTickets(project.id)
-					for ticket in tickets:
-						session.add(ticket)
+				projectIds = self._applyDelta(session, Project, projects)
+				self._saveSyncProgress(session, progress, cache)
+
+			# Each chunk is committed with the projects it covers, so an
+			# interrupted sync starts again after the last chunk written
+			commitSize = int(getattr(self.config.account, 'sync_commit_size', 5000))
+			pending = [ project for project in projects
+				if project.id not in progress['done'] ]
+			chunk, chunkSize = [], 0
+			for project, tickets in self._fetchTickets(pending):
+				chunk.append((project.id, tickets))
+				chunkSize += len(tickets)
+				if chunkSize >= commitSize:
+					self._commitTickets(chunk, progress, cache)
+					chunk, chunkSize = [], 0
+			if chunk:
+				self._commitTickets(chunk, progress, cache)
+
+			with autocommit(self.session) as session:
+				self._removeStaleProjects(session, projectIds)
+
+				if cache is not None:
+					# A resumed sync didn't ask for everything, keep what it skipped
+					self._saveResponseCache(session, cache, prune=not resumed)
+
+				session.query(PersistentVar)\
+					.filter(PersistentVar.name == SYNC_PROGRESS)\
+					.delete(synchronize_session=False)
 
 				lastSynced = PersistentVar(
 					name='internal.lastSynced',
 					value=datetime.utcnow()
 				)
 				session.merge(lastSynced)
+
+			# A long-lived core (the daemon) would otherwise keep the old value
+			self.lastSynced = lastSynced.value
 		except:
 			CoreLogger.exception('Could not sync with remote source %s:%s',
 				accountType, accountUrl)
 
-		self.session.execute('PRAGMA foreign_keys=ON')
+	def _pages(self, fetch, *args):
+		cursor = None
+		while True:
+			items, cursor = fetch(*args, cursor=cursor)
+			yield items
+			if cursor is None:
+				return
+
+	def _loadSyncProgress(self):
+		from qtimer.model import PersistentVar
+
+		progress = self.session.query(PersistentVar)\
+			.filter(PersistentVar.name == SYNC_PROGRESS).first()
+
+		# Data from an old interrupted sync is as stale as the cache itself
+		lifetime = timedelta(minutes=int(self.config.account.cache_lifetime))
+		if progress is None or datetime.utcnow() - progress.value['started'] > lifetime:
+			return { 'started': datetime.utcnow(), 'done': set() }
+		return progress.value
+
+	def _saveSyncProgress(self, session, progress, cache):
+		from qtimer.model import PersistentVar
+
+		session.merge(PersistentVar(name=SYNC_PROGRESS, value={
+			'started': progress['started'],
+			'done': set(progress['done']),
+		}))
+
+		if cache is not None:
+			self._saveResponseCache(session, cache, prune=False)
+
+	def _commitTickets(self, chunk, progress, cache):
+		from qtimer.model import Ticket, Timer
+
+		with autocommit(self.session) as session:
+			tickets = [ ticket for _, tickets in chunk for ticket in tickets ]
+			self._applyDelta(session, Ticket, tickets)
+
+			# Tickets gone from a project, unless another project took them
+			for projectId, tickets in chunk:
+				self._removeStale(session, Ticket, set(t.id for t in tickets),
+					Timer.ticket_id, Ticket.project_id == projectId)
+
+			progress['done'].update(projectId for projectId, _ in chunk)
+			self._saveSyncProgress(session, progress, cache)
+
+		CoreLogger.debug('Committed tickets of %d projects', len(chunk))
+
+	def _removeStaleProjects(self, session, projectIds):
+		from qtimer.model import Project, Ticket, Timer
+
+		local = set(row[0] for row in session.query(Project.id))
+		stale = list(local - projectIds)
+		for ids in chunked(stale, SQL_MAX_VARIABLES):
+			self._removeStale(session, Ticket, set(), Timer.ticket_id,
+				Ticket.project_id.in_(ids))
+		self._removeStale(session, Project, projectIds, Ticket.project_id)
+
+	def _loadResponseCache(self):
+		from qtimer.model import CachedResponse
+		from qtimer.plugins.transport import shared_transport
+
+		cache = shared_transport().cache
+		if cache is not None and not cache.loaded:
+			q = self.session.query(CachedResponse.key, CachedResponse.etag,
+				CachedResponse.last_modified, CachedResponse.payload)
+			cache.load(q)
+		return cache
+
+	def _saveResponseCache(self, session, cache, prune=True):
+		from qtimer.model import CachedResponse
+
+		# Only answers which changed are written back
+		dirty = cache.takeDirty()
+		for key, etag, lastModified, payload in dirty:
+			session.merge(CachedResponse(key=key, etag=etag,
+				last_modified=lastModified, payload=payload))
+
+		if not prune:
+			return
+
+		# Anything not requested this sync belongs to a project that is gone
+		used = cache.takeUsed()
+		stale = [ row[0] for row in session.query(CachedResponse.key)
+			if row[0] not in used ]
+		for keys in chunked(stale, SQL_MAX_VARIABLES):
+			session.query(CachedResponse)\
+				.filter(CachedResponse.key.in_(keys))\
+				.delete(synchronize_session=False)
+
+		CoreLogger.debug('Response cache: %d saved, %d removed', len(dirty), len(stale))
+
+	def _applyDelta(self, session, ormClass, remote):
+		import sqlalchemy as sa
+
+		fields = SYNCED_FIELDS[ormClass.__name__]
+		columns = [ getattr(ormClass, field) for field in fields ]
+		local = {}
+		for ids in chunked([ obj.id for obj in remote ], SQL_MAX_VARIABLES):
+			q = session.query(ormClass.id, *columns).filter(ormClass.id.in_(ids))
+			local.update((row[0], tuple(row[1:])) for row in q)
+
+		added, changed = [], []
+		for obj in remote:
+			fingerprint = tuple(getattr(obj, field) for field in fields)
+			if obj.id not in local:
+				added.append(obj)
+			elif local[obj.id] != fingerprint:
+				values = dict(('b_' + field, value)
+					for field, value in zip(fields, fingerprint))
+				values['b_id'] = obj.id
+				changed.append(values)
+
+		CoreLogger.debug('%s delta: %d added, %d changed, %d unchanged',
+			ormClass.__name__, len(added), len(changed),
+			len(remote) - len(added) - len(changed))
+
+		# Skip the unit of work and hand whole batches to executemany
+		table = ormClass.__table__
+		batchSize = int(getattr(self.config.account, 'sync_batch_size', 500))
+
+		rows = (dict((column.name, getattr(obj, column.name))
+			for column in table.columns) for obj in added)
+		for batch in chunked(rows, batchSize):
+			session.execute(table.insert(), batch)
+
+		if changed:
+			stmt = table.update().where(table.c.id == sa.bindparam('b_id'))\
+				.values(dict((field, sa.bindparam('b_' + field)) for field in fields))
+			for batch in chunked(changed, batchSize):
+				session.execute(stmt, batch)
+
+		return set(obj.id for obj in remote)
+
+	def _removeStale(self, session, ormClass, remoteIds, referenced, scope=None):
+		q = session.query(ormClass.id)
+		if scope is not None:
+			q = q.filter(scope)
+		local = set(row[0] for row in q)
+		stale = local - remoteIds
+		if not stale:
+			return
+
+		# Rows still referenced locally are kept so foreign keys stay intact
+		for ids in chunked(list(stale), SQL_MAX_VARIABLES):
+			query = session.query(referenced).filter(referenced.in_(ids))
+			stale -= set(row[0] for row in query)
+
+		CoreLogger.debug('%s delta: %d removed', ormClass.__name__, len(stale))
+		for ids in chunked(stale, SQL_MAX_VARIABLES):
+			session.query(ormClass).filter(ormClass.id.in_(ids))\
+				.delete(synchronize_session=False)
+
+	def _fetchTickets(self, projects):
+		''' Yield (project, tickets) for each project, in the same order '''
+		workers = int(getattr(self.config.account, 'sync_workers', 1))
+
+		def listTickets(project):
+			CoreLogger.debug("Getting list of tickets for pid '%s' from remote", project.id)
+			return [ ticket for page in self._pages(self.plugin.pageTickets, project.id)
+				for ticket in page ]
+
+		if workers <= 1 or len(projects) <= 1:
+			for project in projects:
+				yield project, listTickets(project)
+			return
+
+		# Requests are independent, so keep a few of them running while the
+		# results are written, but only a few so memory doesn't grow with
+		# the size of the account
+		CoreLogger.debug('Fetching tickets for %d projects with %d workers',
+			len(projects), workers)
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			running = deque()
+			for project in projects:
+				running.append((project, executor.submit(listTickets, project)))
+				if len(running) >= workers * 2:
+					project, future = running.popleft()
+					yield project, future.result()
+			while running:
+				project, future = running.popleft()
+				yield project, future.result()
 
 	def roundTime(self, dt):
 		roundTo = int(self.config.timers.rounding)
+		if isinstance(dt, timedelta):
+			# Durations can be longer than a day, so round their whole length
+			seconds = round(dt.total_seconds())
+			return timedelta(seconds=(seconds + roundTo // 2) // roundTo * roundTo)
+
 		seconds = (dt - dt.min).seconds
 		# // is a floor division not a comment on the following line
 		rounding = (seconds + roundTo / 2) // roundTo * roundTo
@@ -142,18 +438,31 @@ class QTimerCore(LazyObject):
 
 		# If we call self.session, we will initialize the db, \
 		# which would be bad if we haven't already
-		if (hasattr(self, 'session')):
+		if 'session' in vars(self):
 			self.session.flush()
 			self.session.close()
 
+		if 'plugin' in vars(self):
+			from qtimer.plugins.transport import shared_transport
+			transport = shared_transport()
+			CoreLogger.debug('%d remote requests took %.3fs', len(transport.timings),
+				sum(timing[-1] for timing in transport.timings))
+			transport.close()
+
+
+def sql_session():
+	global SQLSession
+	if SQLSession is None:
+		from sqlalchemy.orm import sessionmaker
+		SQLSession = sessionmaker()
+	return SQLSession
+
 
 def set_sqlite_pragma(conn, conn_record):
 	cursor = conn.cursor()
 	cursor.execute('PRAGMA foreign_keys=ON')
 	cursor.close()
 
-event.listen(Engine, 'connect', set_sqlite_pragma)
-
 
 def configure_logging(configPath):
 	if not path.exists(configPath):
@@ -165,16 +474,41 @@ def configure_logging(configPath):
 	if not path.exists(path.dirname(LOG_PATH)):
 		makedirs(path.dirname(LOG_PATH))
 
-	handler = logging.handlers.RotatingFileHandler(LOG_PATH, backupCount=50)
+	parser = configparser.RawConfigParser()
+	parser.read(configPath)
+	option = lambda name, default: parser.get('debug_log', name, fallback=default)
+
+	backupCount = int(option('backup_count', 5))
+	rotate = option('rotate', 'size').lower()
+	if rotate == 'run':
+		handler = logging.handlers.RotatingFileHandler(LOG_PATH, backupCount=backupCount)
+		handler.doRollover()
+	elif rotate == 'time':
+		handler = logging.handlers.TimedRotatingFileHandler(LOG_PATH,
+			when=option('when', 'midnight'), backupCount=backupCount)
+	else:
+		handler = logging.handlers.RotatingFileHandler(LOG_PATH,
+			maxBytes=int(option('max_bytes', 1048576)), backupCount=backupCount)
+
 	handler.formatter = logging.Formatter(
 		'%(asctime)s|%(levelname)-7.7s [%(name)s] %(message)s', '%H:%M:%S')
-	handler.doRollover()
-	logging.getLogger().addHandler(handler)
+
+	if option('queue', 'true').lower() != 'true':
+		logging.getLogger().addHandler(handler)
+		return None
+
+	# Callers only pay for putting a record on the queue, the file is
+	# written (and rotated) from the listener's thread
+	records = queue.Queue(-1)
+	listener = logging.handlers.QueueListener(records, handler)
+	listener.start()
+	logging.getLogger().addHandler(logging.handlers.QueueHandler(records))
+	return listener
 
 
 @contextmanager
 def create_qtimer(configPath):
-	configure_logging(configPath)
+	listener = configure_logging(configPath)
 	CoreLogger.debug('QTimerCore created through create_qtimer.')
 	qtimer = QTimerCore(configPath)
 	try:
@@ -182,7 +516,10 @@ def create_qtimer(configPath):
 	finally:
 		CoreLogger.debug('Control returned to create_qtimer, destroying core')
 		qtimer.close()
-		CoreLogger.debug('Destroying SQLSession')
-		SQLSession.close_all()
+		if SQLSession is not None:
+			CoreLogger.debug('Destroying SQLSession')
+			SQLSession.close_all()
 		CoreLogger.debug('Shutting down logging')
+		if listener:
+			listener.stop()
 		logging.shutdown()
@@ -0,0 +1,162 @@
+# A long-lived process which keeps a QTimerCore warm and runs commands sent
+# to it by qtimer.client over a unix socket
+
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from os import path
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+
+from qtimer.cmd_line import QTimerCommandLine
+from qtimer.core import create_qtimer
+from qtimer.env import CONFIG_PATH, SOCKET_PATH
+
+DaemonLogger = logging.getLogger(__name__)
+
+
+class StreamProxy(object):
+	''' A file-like object which forwards writes to the client as messages '''
+
+	def __init__(self, wfile, stream):
+		self.wfile = wfile
+		self.stream = stream
+
+	def write(self, data):
+		if data:
+			send_message(self.wfile, {'stream': self.stream, 'data': data})
+		return len(data)
+
+	def flush(self):
+		self.wfile.flush()
+
+
+class QTimerRequestHandler(socketserver.StreamRequestHandler):
+
+	def handle(self):
+		line = self.rfile.readline()
+		if not line:
+			return
+
+		request = json.loads(line.decode('utf-8'))
+		out = StreamProxy(self.wfile, 'out')
+		err = StreamProxy(self.wfile, 'err')
+		code = self.server.execute(request['argv'], request.get('cwd'), out, err,
+			request.get('stdin', ''))
+		send_message(self.wfile, {'exit': code})
+
+
+class QTimerServer(socketserver.UnixStreamServer):
+
+	def __init__(self, socketPath, program):
+		# Commands share one database session, so requests are handled in turn
+		socketserver.UnixStreamServer.__init__(self, socketPath, QTimerRequestHandler)
+		self.program = program
+
+	def execute(self, argv, cwd, out, err, stdin=''):
+		DaemonLogger.debug('Running command: %s', argv)
+		core = self.program.core
+		if cwd and path.isdir(cwd):
+			os.chdir(cwd)
+
+		code = 0
+		with redirect_stdout(out), redirect_stderr(err), redirect_handlers(out, err), \
+				redirect_stdin(io.StringIO(stdin)):
+			try:
+				args = self.program.parseArgs(argv)
+				self.program.executeCommand(args)
+			except SystemExit as e:
+				code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+			except BaseException as e:
+				DaemonLogger.exception('Command %s failed', argv)
+				err.write('%s\n' % e)
+				code = 1
+			finally:
+				# Don't hold a stale transaction open between requests
+				if 'session' in vars(core):
+					core.session.close()
+				# A refresh in another process moves it, so read it again next time
+				vars(core).pop('lastSynced', None)
+
+		return code
+
+
+@contextmanager
+def redirect_stdin(stream):
+	''' Commands read the client's stdin, never the daemon's own '''
+	original, sys.stdin = sys.stdin, stream
+	try:
+		yield
+	finally:
+		sys.stdin = original
+
+
+@contextmanager
+def redirect_handlers(out, err):
+	''' Point every stdout/stderr logging handler at the client for a request '''
+	targets = { sys.__stdout__: out, sys.__stderr__: err }
+	loggers = [ logging.getLogger(), logging.getLogger('output') ]
+	swapped = []
+	for logger in loggers:
+		for handler in logger.handlers:
+			stream = getattr(handler, 'stream', None)
+			if isinstance(handler, logging.StreamHandler) and stream in targets:
+				swapped.append((handler, stream))
+				handler.stream = targets[stream]
+	try:
+		yield
+	finally:
+		for handler, stream in swapped:
+			handler.stream = stream
+
+
+def send_message(wfile, message):
+	wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+	wfile.flush()
+
+
+def warm_up(program):
+	''' Load everything a command could need before the first request '''
+	core = program.core
+	core.config
+	core.session
+	core.plugin
+	for identifier in program.manifest:
+		program.addArguments(identifier)
+
+
+def main(configPath=CONFIG_PATH, socketPath=SOCKET_PATH):
+	if not path.exists(path.dirname(socketPath)):
+		os.makedirs(path.dirname(socketPath))
+
+	if path.exists(socketPath):
+		probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			probe.connect(socketPath)
+			raise RuntimeError('A qtimer daemon is already listening on %s' % socketPath)
+		except (ConnectionRefusedError, FileNotFoundError):
+			os.remove(socketPath)
+		finally:
+			probe.close()
+
+	with create_qtimer(configPath) as core:
+		program = QTimerCommandLine(core)
+		warm_up(program)
+
+		server = QTimerServer(socketPath, program)
+		os.chmod(socketPath, 0o600)
+		DaemonLogger.info('qtimer daemon listening on %s', socketPath)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.server_close()
+			os.remove(socketPath)
+
+
+if __name__ == '__main__':
+	main()
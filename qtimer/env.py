@@ -5,11 +5,14 @@ APP_NAME = 'qTimer'
 ORG_NAME = 'Solipsis Development'
 INI_NAME = '.qtimer'
 LOG_NAME = 'debug.log'
+SOCKET_NAME = 'qtimer.sock'
+MANIFEST_NAME = 'commands.json'
 
 VERSION = '0.1.5'
 
 PLUGIN_MOD = 'qtimer.plugins.%s'
-COMMANDS_MOD = 'qtimer.commands.%s'
+COMMANDS_PKG = 'qtimer.commands'
+COMMANDS_MOD = COMMANDS_PKG + '.%s'
 
 APP_DIRS = AppDirs(APP_NAME, ORG_NAME, roaming=True)
 
@@ -19,3 +22,5 @@ DATA_DIR = APP_DIRS.user_data_dir
 
 CONFIG_PATH = path.expanduser(path.join('~', INI_NAME))
 LOG_PATH = path.join(APP_DIRS.user_log_dir, LOG_NAME)
+SOCKET_PATH = path.join(DATA_DIR, SOCKET_NAME)
+MANIFEST_PATH = path.join(APP_DIRS.user_cache_dir, MANIFEST_NAME)
@@ -0,0 +1,105 @@
+# Records which commands exist so the command line doesn't have to import
+# every command module just to build its parser
+
+from importlib import import_module
+from importlib.util import find_spec
+from os import path, listdir, makedirs
+import json
+import logging
+import os
+
+from qtimer.env import COMMANDS_PKG, MANIFEST_PATH
+
+ManifestLogger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Modules in a command package which never hold a command
+IGNORED_MODULES = ('__init__', 'command', )
+
+
+def package_dir(package):
+	spec = find_spec(package)
+	if not spec or not spec.submodule_search_locations:
+		raise RuntimeError('Command package %s could not be found' % package)
+	return list(spec.submodule_search_locations)[0]
+
+
+def command_modules(package):
+	directory = package_dir(package)
+	for item in sorted(listdir(directory)):
+		name, ext = path.splitext(item)
+		if ext == '.py' and name not in IGNORED_MODULES \
+				and path.isfile(path.join(directory, item)):
+			yield name, path.join(directory, item)
+
+
+def signature(packages):
+	''' Changes whenever a command module is added, removed or modified '''
+	return [ [ package, [ [ name, path.getmtime(f) ]
+		for name, f in command_modules(package) ] ] for package in packages ]
+
+
+def class_name(module):
+	# Predict the class name to be the TitleCase of the script mod
+	return module.split('.')[-1].title().replace('_', '')
+
+
+def import_command(module, className):
+	command = getattr(import_module(module), className)()
+	if not hasattr(command, 'COMMAND_IDENTIFIER'):
+		raise RuntimeError('Command %s must declare an ID' % module)
+	return command
+
+
+def build(packages):
+	commands = {}
+	for package in packages:
+		for name, f in command_modules(package):
+			module = '%s.%s' % (package, name)
+			command = import_command(module, class_name(module))
+			commands[command.COMMAND_IDENTIFIER] = {
+				'help': getattr(command, 'COMMAND_HELP', None),
+				'module': module,
+				'class': command.__class__.__name__,
+			}
+	return commands
+
+
+def load(packages=(COMMANDS_PKG, ), manifestPath=None):
+	'''
+	Return a dict of command identifier to its help, module and class,
+	rebuilding the cached manifest if any command package changed
+	'''
+	manifestPath = manifestPath or MANIFEST_PATH
+	packages = list(packages)
+	current = signature(packages)
+	try:
+		with open(manifestPath) as f:
+			manifest = json.load(f)
+		if manifest.get('version') == MANIFEST_VERSION \
+				and manifest.get('signature') == current:
+			return manifest['commands']
+	except (IOError, ValueError) as e:
+		ManifestLogger.debug('Could not read command manifest: %s', repr(e))
+
+	ManifestLogger.debug('Rebuilding command manifest for %s', packages)
+	commands = build(packages)
+	manifest = {
+		'version': MANIFEST_VERSION,
+		'signature': current,
+		'commands': commands,
+	}
+
+	try:
+		if not path.exists(path.dirname(manifestPath)):
+			makedirs(path.dirname(manifestPath))
+		tmpPath = '%s.%d' % (manifestPath, os.getpid())
+		with open(tmpPath, 'w') as f:
+			json.dump(manifest, f)
+		os.replace(tmpPath, manifestPath)
+	except (IOError, OSError) as e:
+		# A read-only cache only costs us speed
+		ManifestLogger.warn('Could not write command manifest: %s', repr(e))
+
+	return commands
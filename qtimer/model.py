@@ -4,9 +4,12 @@ from datetime import datetime, timedelta
 # SQLAlchemy imports
 from sqlalchemy import *
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql.expression import *
 from sqlalchemy.orm import relationship
 
+from qtimer.util import local_date
+
 
 # Base to store our metadata
 Base = declarative_base()
@@ -20,6 +23,14 @@ STATUS_ACTIVE = 'active'
 STATUS_IDLE = 'idle'
 STATUS_POSTED = 'posted'
 
+INTENT_PENDING = 'pending'
+INTENT_SENDING = 'sending'
+INTENT_SENT = 'sent'
+# The post may or may not have reached the remote, only the user can tell
+INTENT_UNKNOWN = 'unknown'
+# The remote refused the post, sending it again as is won't help
+INTENT_FAILED = 'failed'
+
 
 class BaseMixin(object):
 	@declared_attr
@@ -44,6 +55,23 @@ class PersistentVar(Base):
 	value = Column(PickleType, nullable=False)
 
 
+class CachedResponse(Base):
+	'''
+	The validators and parsed payload of a remote GET, so the next sync can
+	ask the remote whether it changed instead of downloading it again.
+	'''
+	@declared_attr
+	def __tablename__(cls):
+		return 'qtimer_%ss' % cls.__name__.lower()
+
+	# sha1 of the requested url
+	key = Column(Unicode(40), nullable=False, primary_key=True)
+
+	etag = Column(Unicode(256), nullable=True)
+	last_modified = Column(Unicode(64), nullable=True)
+	payload = Column(PickleType, nullable=False)
+
+
 class Project(BaseMixin, NamedMixin, Base):
 	# Defines a one-to-many relationship between Project and Ticket
 	tickets = relationship('Ticket',  order_by='Ticket.name', backref='project', passive_updates=False)
@@ -57,7 +85,7 @@ class Ticket(BaseMixin, NamedMixin, Base):
 	timers = relationship('Timer', backref='ticket', passive_updates=False)
 
 	# Defines a one-to-many relationship between Project and Ticket
-	project_id = Column(Integer, ForeignKey('qtimer_projects.id'), nullable=False)
+	project_id = Column(Integer, ForeignKey('qtimer_projects.id'), nullable=False, index=True)
 
 
 class Timer(BaseMixin, NamedMixin, Base):
@@ -65,37 +93,117 @@ class Timer(BaseMixin, NamedMixin, Base):
 	billable_status = Column(Integer, nullable=True, default=None)
 
 	# Defines a many-to-one relationship between Timer and Ticket
-	ticket_id = Column(Integer, ForeignKey('qtimer_tickets.id'), nullable=True)
+	ticket_id = Column(Integer, ForeignKey('qtimer_tickets.id'), nullable=True, index=True)
 
 	# Defines a one-to-many relationship between Timer and Session
 	sessions = relationship('Session', order_by='Session.start', passive_updates=False)
 
+	# A summary of sessions so a timer can be shown without reading them,
+	# anything changing a timer's sessions must call refresh_summaries
+	first_start = Column(DateTime, nullable=True, default=None)
+	closed_seconds = Column(Float, nullable=False, default=0, server_default='0')
+	open_start = Column(DateTime, nullable=True, default=None)
+
+	# Running timers are a handful out of thousands, this is what show uses
+	__table_args__ = (
+		Index('ix_qtimer_timers_running', 'open_start',
+			sqlite_where=open_start != None),
+	)
+
 	@property
 	def start(self):
-		return self.sessions[0].start if self.sessions else None
+		return self.first_start
+
+	@property
+	def day(self):
+		''' The local day the timer started on, which is the day its time is for '''
+		return local_date(self.first_start)
 
 	@property
 	def duration(self):
-		duration = timedelta()
-		for session in self.sessions:
-			end = session.end if session.end else datetime.utcnow()
-			duration += (end - session.start)
+		duration = timedelta(seconds=self.closed_seconds or 0)
+		if self.open_start:
+			duration += datetime.utcnow() - self.open_start
 		return duration
 
-	@property
+	@hybrid_property
 	def status(self):
 		if self.posted:
 			return STATUS_POSTED
-		for session in self.sessions:
-			if not session.end == None:
-				continue
-			return STATUS_ACTIVE
-		return STATUS_IDLE
+		return STATUS_ACTIVE if self.open_start else STATUS_IDLE
+
+	@status.expression
+	def status(cls):
+		return case([
+			(cls.posted == True, STATUS_POSTED),
+			(cls.open_start != None, STATUS_ACTIVE),
+		], else_=STATUS_IDLE)
+
+
+# Which timers a post intent covers
+post_intent_timers = Table('qtimer_postintent_timers', Base.metadata,
+	Column('intent_id', Integer, ForeignKey('qtimer_postintents.id'), primary_key=True),
+	Column('timer_id', Integer, ForeignKey('qtimer_timers.id'), primary_key=True, index=True),
+)
+
+
+class PostIntent(BaseMixin, Base):
+	'''
+	An outbox entry for timers waiting to be posted to the remote source.
+	The timers are only marked posted once the remote confirms the post.
+	'''
+	# Sent with every attempt, so the remote can tell a retry from a new entry
+	idempotency_key = Column(Unicode(64), nullable=False, unique=True)
+
+	# Remote ids of the project and ticket to post to
+	project_id = Column(Integer, nullable=False)
+	ticket_id = Column(Integer, nullable=False)
+
+	state = Column(Unicode(16), nullable=False, default=INTENT_PENDING, index=True)
+	created = Column(DateTime, nullable=False, default=datetime.utcnow)
+	attempts = Column(Integer, nullable=False, default=0, server_default='0')
+	last_error = Column(UnicodeText, nullable=True)
+
+	timers = relationship('Timer', secondary=post_intent_timers,
+		order_by='Timer.id', backref='intents')
 
 
 class Session(BaseMixin, Base):
 	start = Column(DateTime, nullable=False, index=True)
-	end = Column(DateTime, nullable=True, default=None, index=True)
+	end = Column(DateTime, nullable=True, default=None)
 
 	# Defines a one-to-many relationship between Timer and Session
 	timer_id = Column(Integer, ForeignKey('qtimer_timers.id'), nullable=False)
+
+	__table_args__ = (
+		# Loading a timer's sessions in order never has to touch the table
+		Index('ix_qtimer_sessions_timer_start', 'timer_id', 'start', 'end'),
+		# Finding the session to stop only looks at sessions still running
+		Index('ix_qtimer_sessions_open', 'timer_id', sqlite_where=end == None),
+	)
+
+
+def refresh_summaries(session, timerIds=None):
+	"""
+		Rebuild the session summary stored on the given timers, or on every
+		timer if no ids are given, from their full session history
+	"""
+	session.flush()
+
+	forTimer = Session.timer_id == Timer.id
+	seconds = (func.julianday(Session.end) - func.julianday(Session.start)) * 86400
+	# julianday() is a float, so an hour comes out as 3599.99998...
+	closed = func.round(func.coalesce(func.sum(seconds), 0), 3)
+	values = {
+		Timer.first_start: select([ func.min(Session.start) ])\
+			.where(forTimer).as_scalar(),
+		Timer.closed_seconds: select([ closed ])\
+			.where(and_(forTimer, Session.end != None)).as_scalar(),
+		Timer.open_start: select([ func.min(Session.start) ])\
+			.where(and_(forTimer, Session.end == None)).as_scalar(),
+	}
+
+	q = session.query(Timer)
+	if timerIds is not None:
+		q = q.filter(Timer.id.in_(list(timerIds)))
+	return q.update(values, synchronize_session=False)
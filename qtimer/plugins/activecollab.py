@@ -1,8 +1,7 @@
-# This is the real library we use
-# we're just 'talking' like qTimer now
-from activecollab.library import ACRequest
-
+# activeCollab is plain HTTP, so we talk to its API ourselves
+# through the transport every plugin shares
 from qtimer.plugins.prototype import PluginPrototype, PluginError
+from qtimer.plugins.transport import shared_transport
 from qtimer.model import Project, Ticket
 
 
@@ -12,37 +11,55 @@ def load_qtimer_plugin(url=None, token=None):
 
 
 class ActiveCollabPlugin(PluginPrototype):
+	usesSharedTransport = True
 
 	def __init__(self, url, token):
 		self.url = url
 		self.token = token
+		self.transport = shared_transport()
 
-	def listProjects(self):
-		req = ACRequest('projects', ac_url=self.url,
-			api_key=self.token)
+		base = url if '://' in url else 'https://' + url
+		self.apiUrl = base.rstrip('/') + '/api.php'
 
+	def listProjects(self):
 		makeProject = lambda item: Project(id=item['id'], name=item['name'])
-		return filter(makeProject, req.execute())
+		return [ makeProject(item) for item in self._request('projects') ]
 
 	def listTickets(self, projectId=-1):
 		if (projectId == -1):
 			raise PluginError('Invalid project id')
 
-		req = ACRequest('projects', item_id=projectId, subcommand='tickets',
-			ac_url=self.url, api_key=self.token)
-
 		makeTicket = lambda item: Ticket(id=item['id'], name=item['name'],
 			ticket_id=item['ticket_id'], project_id=projectId)
 
-		return [ makeTicket(item) for item in req.execute() ]
+		items = self._request('projects/%s/tickets' % projectId)
+		return [ makeTicket(item) for item in items ]
 
-	def postTimer(self, projectId=-1, ticketId=-1, data=None):
+	def postTimer(self, projectId=-1, ticketId=-1, data=None, idempotencyKey=None):
 		if (projectId == -1):
 			raise PluginError('Invalid project id')
 
 		if (ticketId == -1):
 			raise PluginError('Invalid ticket id')
 
-		req = ACRequest('projects', item_id=projectId, subcommand='time/add',
-			data=data, ac_url=self.url, api_key=self.token)
-		return req.execute()
+		record = {
+			'submitted': 'submitted',
+			'time[value]': '%.2f' % (data.duration.total_seconds() / 3600),
+			'time[record_date]': data.day.strftime('%Y-%m-%d'),
+			'time[body]': data.name,
+			'time[billable_status]': data.billable_status or 0,
+		}
+		# activeCollab itself ignores the key, so idempotentPosts stays off
+		headers = { 'Idempotency-Key': idempotencyKey } if idempotencyKey else None
+		return self._request('projects/%s/time/add' % projectId, record, headers)
+
+	def _request(self, pathInfo, data=None, headers=None):
+		params = {
+			'path_info': pathInfo,
+			'auth_api_token': self.token,
+			'format': 'json',
+		}
+		if data is None:
+			return self.transport.getJSON(self.apiUrl, params=params)
+		return self.transport.request('POST', self.apiUrl, params=params, data=data,
+			headers=headers).json()
@@ -6,13 +6,16 @@ from qtimer.plugins.prototype import PluginPrototype, PluginError
 from qtimer.model import Project, Ticket
 from qtimer.env import APP_NAME, VERSION
 
+# The most items FreshBooks returns in one page
+PAGE_SIZE = 100
+
 
 # Yes, magic methods suck, but this makes it easier to use classes
 def load_qtimer_plugin(url=None, token=None):
 	return FreshBooksPlugin(url, token)
 
 
-def FreshBooksPlugin(PluginPrototype):
+class FreshBooksPlugin(PluginPrototype):
 	def __init__(self, url, token):
 		self.client = api.TokenClient(
 			url,
@@ -21,26 +24,52 @@ def FreshBooksPlugin(PluginPrototype):
 		)
 
 	def listProjects(self):
-		response = self.client.project.list()
+		return list(self._allPages(self.pageProjects))
+
+	def listTickets(self, projectId=-1):
+		return list(self._allPages(self.pageTickets, projectId))
+
+	def pageProjects(self, cursor=None):
+		page = cursor or 1
+		response = self.client.project.list(page=page, per_page=PAGE_SIZE)
 
-		# Be nice and give them a filter object
 		makeProject = lambda item: Project(
-			id=item.project_id, name=item.name
+			id=int(item.project_id), name=str(item.name)
 		)
-		return filter(makeProject, response.projects.project)
+		projects = response.projects
+		items = getattr(projects, 'project', [])
+		return [ makeProject(item) for item in items ], self._nextPage(projects, page)
 
-	def listTickets(self, projectId=-1):
+	def pageTickets(self, projectId=-1, cursor=None):
 		if (projectId == -1):
 			raise PluginError('Invalid project id')
-		response = self.client.tasks.list(dict(project_id=projectId))
+
+		page = cursor or 1
+		response = self.client.task.list(project_id=projectId, page=page,
+			per_page=PAGE_SIZE)
 
 		makeTicket = lambda task: Ticket(
-			id=task.task_id, name=task.name,
-			ticket_id=task.task_id, project_id=projectId
+			id=int(task.task_id), name=str(task.name),
+			ticket_id=int(task.task_id), project_id=projectId
 		)
+		tasks = response.tasks
+		items = getattr(tasks, 'task', [])
+		return [ makeTicket(task) for task in items ], self._nextPage(tasks, page)
 
-		return filter(makeTicket, response.tasks.task)
-
-	def postTimer(self, projectId=-1, ticketId=-1, data=None):
+	def postTimer(self, projectId=-1, ticketId=-1, data=None, idempotencyKey=None):
 		# TODO
 		pass
+
+	def _nextPage(self, listing, page):
+		# Lists carry how many pages there are as an attribute
+		pages = int(listing.attrib.get('pages', 1))
+		return page + 1 if page < pages else None
+
+	def _allPages(self, fetch, *args):
+		cursor = None
+		while True:
+			items, cursor = fetch(*args, cursor=cursor)
+			for item in items:
+				yield item
+			if cursor is None:
+				return
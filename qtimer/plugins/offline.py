@@ -23,5 +23,5 @@ class OfflinePlugin(PluginPrototype):
 		"""
 		return []
 
-	def postTimer(self, projectId=-1, ticketId=-1, data=None):
+	def postTimer(self, projectId=-1, ticketId=-1, data=None, idempotencyKey=None):
 		pass
@@ -1,4 +1,10 @@
 class PluginPrototype:
+	# Set if the remote ignores a post with an idempotencyKey it has seen
+	idempotentPosts = False
+
+	# Set if every request goes through qtimer.plugins.transport
+	usesSharedTransport = False
+
 	def listProjects(self):
 		"""
 			Return a list of dictionary objects representing a project.  Each project
@@ -15,9 +21,49 @@ class PluginPrototype:
 		"""
 		raise PluginError('You must implement this method')
 
-	def postTimer(self, projectId = -1, ticketId = -1, data = None):
+	def pageProjects(self, cursor = None):
+		"""
+			Return a page of projects and the cursor of the next page, or None
+			after the last page.  The first page is asked for with a cursor of
+			None.  Plugins whose remote pages its lists should implement this,
+			the default returns all of listProjects as a single page.
+		"""
+		return self.listProjects(), None
+
+	def pageTickets(self, projectId = -1, cursor = None):
+		"""
+			Return a page of tickets in a given project and the cursor of the
+			next page, like pageProjects.
+		"""
+		return self.listTickets(projectId), None
+
+	def postTimer(self, projectId = -1, ticketId = -1, data = None, idempotencyKey = None):
+		"""
+			Post the time in data to a ticket.  data.start is in UTC, the
+			time should be recorded on the local date in data.day.
+			idempotencyKey is the same for every attempt at posting the same
+			time, plugins should send it to the remote if it can use it to
+			ignore repeated posts.
+		"""
 		raise PluginError('You must implement this method')
 
+class TimeEntry(object):
+	"""
+		The time of several timers on the same ticket and day, passed to
+		postTimer as data when they are posted as a single entry.  It has
+		the attributes of a Timer that are useful to plugins.
+	"""
+	def __init__(self, timers, duration):
+		self.timers = timers
+		self.name = '; '.join(timer.name for timer in timers)
+		self.start = min(timer.start for timer in timers)
+		# The timers were grouped by the local day they started on
+		self.day = timers[0].day
+		self.duration = duration
+		self.billable_status = timers[0].billable_status
+		self.ticket_id = timers[0].ticket_id
+		self.posted = False
+
 class PluginError(Exception):
 	def __init__(self, value):
 		self.value = value
@@ -0,0 +1,171 @@
+# Keeps the calls made to a plugin under the rate its remote source accepts.
+# Every call waits for a token from a bucket refilled at a fixed rate and for
+# one of a number of slots, which grows while calls succeed and halves as soon
+# as the remote says we are going too fast.
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import wraps
+import logging
+import threading
+import time
+
+from qtimer.plugins.transport import HTTPError, not_processed
+
+ThrottleLogger = logging.getLogger(__name__)
+
+# Never wait longer than this (in seconds) because of a Retry-After header
+MAX_RETRY_AFTER = 300
+
+
+def retry_delay(retryAfter, attempt, backoff=1.0):
+	'''
+	Seconds to wait before retrying a throttled call.  Retry-After holds either
+	a number of seconds or a date, without it we back off exponentially.
+	'''
+	delay = None
+	if retryAfter:
+		try:
+			delay = float(retryAfter)
+		except ValueError:
+			try:
+				when = parsedate_to_datetime(retryAfter)
+				delay = (when - datetime.now(timezone.utc)).total_seconds()
+			except (TypeError, ValueError):
+				pass
+
+	if delay is None:
+		delay = backoff * (2 ** attempt)
+	return min(max(delay, 0), MAX_RETRY_AFTER)
+
+
+class TokenBucket(object):
+	''' Allows rate calls a second on average and bursts of up to burst calls '''
+
+	def __init__(self, rate, burst):
+		self.rate = rate
+		self.capacity = max(burst, 1)
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+
+		self._lock = threading.Lock()
+
+	def take(self):
+		''' Block until a token is available, a rate of 0 means no limit '''
+		if self.rate <= 0:
+			return
+
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+
+class AdaptiveLimit(object):
+	'''
+	Limits how many calls run at the same time.  The limit grows by one after
+	as many successful calls as the limit allows at once, up to maximum, and
+	is halved when a call is throttled (additive increase, multiplicative
+	decrease), which settles on the most the remote will take.
+	'''
+
+	def __init__(self, maximum):
+		self.maximum = max(maximum, 1)
+		self.limit = self.maximum
+		self.active = 0
+		self.successes = 0
+		self.pausedUntil = 0
+
+		self._condition = threading.Condition()
+
+	@contextmanager
+	def slot(self):
+		with self._condition:
+			while True:
+				paused = self.pausedUntil - time.monotonic()
+				if paused > 0:
+					self._condition.wait(paused)
+				elif self.active >= self.limit:
+					self._condition.wait()
+				else:
+					break
+			self.active += 1
+
+		try:
+			yield
+		finally:
+			with self._condition:
+				self.active -= 1
+				self._condition.notify_all()
+
+	def succeeded(self):
+		with self._condition:
+			self.successes += 1
+			if self.successes < self.limit:
+				return
+			self.successes = 0
+			if self.limit < self.maximum:
+				self.limit += 1
+				ThrottleLogger.debug('Raised concurrency to %d', self.limit)
+				self._condition.notify_all()
+
+	def throttled(self, delay):
+		''' Halve the limit and hold back every call for delay seconds '''
+		with self._condition:
+			now = time.monotonic()
+			# Calls already running when we backed off count as one throttle
+			if now >= self.pausedUntil:
+				self.limit = max(self.limit // 2, 1)
+				ThrottleLogger.debug('Lowered concurrency to %d', self.limit)
+			self.successes = 0
+			self.pausedUntil = max(self.pausedUntil, now + delay)
+
+
+class ThrottledPlugin(object):
+	'''
+	Wraps a plugin so every method called on it goes through one rate limiter
+	and concurrency limit.  Throttled calls are retried up to retries times.
+	'''
+
+	def __init__(self, plugin, rate=0, burst=1, maxConcurrency=4, retries=3):
+		self.plugin = plugin
+		self.retries = retries
+		self.bucket = TokenBucket(rate, burst)
+		self.limit = AdaptiveLimit(maxConcurrency)
+
+	def __getattr__(self, name):
+		attr = getattr(self.plugin, name)
+		if not callable(attr):
+			return attr
+
+		@wraps(attr)
+		def call(*args, **kwargs):
+			return self._call(attr, args, kwargs)
+		return call
+
+	def _call(self, func, args, kwargs):
+		attempt = 0
+		while True:
+			self.bucket.take()
+			with self.limit.slot():
+				try:
+					result = func(*args, **kwargs)
+				except HTTPError as e:
+					if not not_processed(e) or attempt >= self.retries:
+						raise
+					delay = retry_delay(e.retryAfter, attempt)
+				else:
+					self.limit.succeeded()
+					return result
+
+			ThrottleLogger.warning('%s was throttled, retrying in %.1fs',
+				func.__name__, delay)
+			self.limit.throttled(delay)
+			attempt += 1
@@ -0,0 +1,316 @@
+# An HTTP client shared by every plugin in a run.  Connections are kept open
+# and reused, so TLS and TCP setup is paid once per host instead of per call.
+
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlencode
+import gzip
+import hashlib
+import http.client
+import json
+import logging
+import threading
+import time
+
+from qtimer.plugins.prototype import PluginError
+from qtimer.env import APP_NAME, VERSION
+
+TransportLogger = logging.getLogger(__name__)
+
+# Only these are sent again when a kept-alive connection turns out to be dead
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', )
+
+CONNECTION_CLASSES = {
+	'http': http.client.HTTPConnection,
+	'https': http.client.HTTPSConnection,
+}
+
+
+class HTTPError(PluginError):
+	def __init__(self, status, reason, retryAfter=None):
+		super(HTTPError, self).__init__('%d %s' % (status, reason))
+		self.status = status
+		self.retryAfter = retryAfter
+
+
+class TransportError(PluginError):
+	''' A request failed on the network, sent tells if it may have arrived '''
+	def __init__(self, value, sent):
+		super(TransportError, self).__init__(value)
+		self.sent = sent
+
+
+def not_processed(error):
+	''' The server turned the request away without acting on it '''
+	return isinstance(error, HTTPError) and (error.status == 429
+		or (error.status == 503 and error.retryAfter is not None))
+
+
+def outcome_unknown(error):
+	'''
+	The request may have been acted on before it failed: it was sent but no
+	answer came, or a server error came which could have happened after the
+	work was done (a 504 from a gateway, say).
+	'''
+	if isinstance(error, HTTPError):
+		return error.status >= 500 and not not_processed(error)
+	if isinstance(error, TransportError):
+		return error.sent
+	return False
+
+
+def is_transient(error, idempotent=True):
+	'''
+	Whether trying a failed call again could succeed without doing its work
+	twice.  Requests the server turned away or which never left are, the
+	ones with an unknown outcome only if they are safe to repeat.
+	'''
+	if not_processed(error):
+		return True
+	if outcome_unknown(error):
+		return idempotent
+	return isinstance(error, TransportError)
+
+
+class Response(object):
+	def __init__(self, status, headers, body, elapsed):
+		self.status = status
+		self.headers = headers
+		self.body = body
+		self.elapsed = elapsed
+
+	def header(self, name, default=None):
+		return self.headers.get(name.lower(), default)
+
+	def json(self):
+		return json.loads(self.body.decode('utf-8'))
+
+
+class ResponseCache(object):
+	'''
+	Validators and parsed payloads of earlier GET requests, keyed by a hash
+	of the url.  QTimerCore loads and saves it, so it outlives a single run.
+	'''
+
+	def __init__(self):
+		self.loaded = False
+
+		self._lock = threading.Lock()
+		self._entries = {}
+		self._dirty = set()
+		self._used = set()
+
+	@staticmethod
+	def key(url):
+		# The url can hold an api token, so only its hash is kept
+		return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+	def load(self, entries):
+		''' entries are (key, etag, lastModified, payload) tuples '''
+		with self._lock:
+			for key, etag, lastModified, payload in entries:
+				self._entries.setdefault(key, (etag, lastModified, payload))
+			self.loaded = True
+
+	def get(self, key):
+		with self._lock:
+			self._used.add(key)
+			return self._entries.get(key)
+
+	def store(self, key, etag, lastModified, payload):
+		with self._lock:
+			self._used.add(key)
+			self._entries[key] = (etag, lastModified, payload)
+			self._dirty.add(key)
+
+	def takeDirty(self):
+		''' Entries stored since the last call, as given to load() '''
+		with self._lock:
+			dirty, self._dirty = self._dirty, set()
+			return [ (key, ) + self._entries[key] for key in dirty ]
+
+	def takeUsed(self):
+		''' Keys looked up or stored since the last call '''
+		with self._lock:
+			used, self._used = self._used, set()
+			return used
+
+
+class HTTPTransport(object):
+
+	def __init__(self, timeout=30, maxPerHost=4):
+		self.timeout = timeout
+		self.maxPerHost = maxPerHost
+		self.userAgent = '%s/%s' % (APP_NAME, VERSION)
+
+		# (method, path, status, seconds) of every request made
+		self.timings = []
+
+		# Set to a ResponseCache to make getJSON() send conditional requests
+		self.cache = None
+
+		self._lock = threading.Lock()
+		self._idle = {}
+		self._slots = {}
+
+	def configure(self, timeout=None, maxPerHost=None):
+		with self._lock:
+			if timeout is not None:
+				self.timeout = timeout
+			if maxPerHost is not None:
+				self.maxPerHost = maxPerHost
+				self._slots = {}
+
+	def request(self, method, url, params=None, data=None, headers=None):
+		'''
+		Make a request and return its Response, raising HTTPError for
+		anything but a 2xx or 304 answer.  params are added to the query
+		string and data is sent form encoded.
+		'''
+		parts = urlsplit(url)
+		host = (parts.scheme, parts.hostname, parts.port)
+		query = '&'.join(q for q in (parts.query, urlencode(params or {})) if q)
+		target = (parts.path or '/') + ('?' + query if query else '')
+
+		sendHeaders = {
+			'Accept-Encoding': 'gzip',
+			'Connection': 'keep-alive',
+			'User-Agent': self.userAgent,
+		}
+		body = None
+		if data is not None:
+			body = urlencode(data).encode('utf-8')
+			sendHeaders['Content-Type'] = 'application/x-www-form-urlencoded'
+		sendHeaders.update(headers or {})
+
+		with self._slot(host):
+			start = time.time()
+			status, reason, responseHeaders, raw = \
+				self._send(host, method, target, body, sendHeaders)
+			elapsed = time.time() - start
+
+		if responseHeaders.get('content-encoding') == 'gzip':
+			raw = gzip.decompress(raw)
+
+		# Never log the query string, it usually holds the api token
+		TransportLogger.debug('%s %s -> %d in %.3fs', method, parts.path, status, elapsed)
+		self.timings.append((method, parts.path, status, elapsed))
+
+		if status >= 400:
+			raise HTTPError(status, reason, responseHeaders.get('retry-after'))
+		return Response(status, responseHeaders, raw, elapsed)
+
+	def getJSON(self, url, params=None):
+		'''
+		GET a JSON document.  If the cache holds an earlier answer the request
+		is made conditional, and a 304 reuses the payload parsed back then.
+		'''
+		cache = self.cache
+		if cache is None:
+			return self.request('GET', url, params=params).json()
+
+		key = cache.key(url + '?' + urlencode(sorted((params or {}).items())))
+		cached = cache.get(key)
+
+		headers = {}
+		if cached:
+			etag, lastModified, payload = cached
+			if etag:
+				headers['If-None-Match'] = etag
+			if lastModified:
+				headers['If-Modified-Since'] = lastModified
+
+		response = self.request('GET', url, params=params, headers=headers)
+		if cached and response.status == 304:
+			return payload
+
+		payload = response.json()
+		etag, lastModified = response.header('etag'), response.header('last-modified')
+		if etag or lastModified:
+			cache.store(key, etag, lastModified, payload)
+		return payload
+
+	def close(self):
+		with self._lock:
+			idle, self._idle = self._idle, {}
+			self.timings = []
+		for connections in idle.values():
+			for connection in connections:
+				connection.close()
+
+	def _send(self, host, method, target, body, headers):
+		if method in IDEMPOTENT_METHODS:
+			connection, reused = self._checkout(host)
+		else:
+			# If the server dropped a kept-alive connection we couldn't tell
+			# whether anything else arrived, so those always get a new one
+			connection, reused = self._open(host), False
+
+		try:
+			response, raw = self._exchange(connection, method, target, body, headers)
+		except TransportError:
+			# The server may have closed a connection we kept open
+			if not reused:
+				raise
+			connection = self._open(host)
+			response, raw = self._exchange(connection, method, target, body, headers)
+
+		responseHeaders = dict((k.lower(), v) for k, v in response.getheaders())
+		if response.will_close:
+			connection.close()
+		else:
+			self._checkin(host, connection)
+
+		return response.status, response.reason, responseHeaders, raw
+
+	def _exchange(self, connection, method, target, body, headers):
+		try:
+			connection.request(method, target, body, headers)
+			response = connection.getresponse()
+			return response, response.read()
+		except (http.client.HTTPException, OSError) as e:
+			connection.close()
+			raise TransportError('%s %s failed: %r' % (method, target.split('?')[0], e), True)
+
+	def _open(self, host):
+		connection = self._connect(host)
+		try:
+			connection.connect()
+		except OSError as e:
+			connection.close()
+			raise TransportError('Could not connect to %s: %r' % (host[1], e), False)
+		return connection
+
+	def _connect(self, host):
+		scheme, hostname, port = host
+		if scheme not in CONNECTION_CLASSES:
+			raise PluginError('Unsupported url scheme %s' % scheme)
+		return CONNECTION_CLASSES[scheme](hostname, port, timeout=self.timeout)
+
+	def _checkout(self, host):
+		with self._lock:
+			idle = self._idle.get(host)
+			if idle:
+				return idle.pop(), True
+		return self._open(host), False
+
+	def _checkin(self, host, connection):
+		with self._lock:
+			self._idle.setdefault(host, []).append(connection)
+
+	@contextmanager
+	def _slot(self, host):
+		''' At most maxPerHost requests to one host at a time '''
+		with self._lock:
+			if host not in self._slots:
+				self._slots[host] = threading.BoundedSemaphore(max(self.maxPerHost, 1))
+			slot = self._slots[host]
+		with slot:
+			yield
+
+
+_shared = HTTPTransport()
+
+
+def shared_transport():
+	''' The transport every plugin should use, configured by QTimerCore '''
+	return _shared
@@ -0,0 +1,41 @@
+"""Timer summary
+
+Revision ID: 0407f0c67ae
+Revises: 3608147bbfb
+Create Date: 2026-10-18 15:40:12.204117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0407f0c67ae'
+down_revision = '3608147bbfb'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+
+def upgrade():
+    op.add_column('qtimer_timers', sa.Column('first_start', sa.DateTime(), nullable=True))
+    op.add_column('qtimer_timers', sa.Column('closed_seconds', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('qtimer_timers', sa.Column('open_start', sa.DateTime(), nullable=True))
+
+    # Fill in the summary of every existing timer
+    op.execute('''
+        UPDATE qtimer_timers SET
+        first_start = (SELECT min(s.start) FROM qtimer_sessions s
+            WHERE s.timer_id = qtimer_timers.id),
+        closed_seconds = (SELECT round(coalesce(sum((julianday(s."end") - julianday(s.start)) * 86400), 0), 3)
+            FROM qtimer_sessions s
+            WHERE s.timer_id = qtimer_timers.id AND s."end" IS NOT NULL),
+        open_start = (SELECT min(s.start) FROM qtimer_sessions s
+            WHERE s.timer_id = qtimer_timers.id AND s."end" IS NULL)
+    ''')
+
+
+def downgrade():
+    op.drop_column('qtimer_timers', 'open_start')
+    op.drop_column('qtimer_timers', 'closed_seconds')
+    op.drop_column('qtimer_timers', 'first_start')
@@ -0,0 +1,26 @@
+"""Round closed seconds
+
+Revision ID: 15a10188acbe
+Revises: f190202536b8
+Create Date: 2026-10-18 18:02:17.514306
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '15a10188acbe'
+down_revision = 'f190202536b8'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+
+def upgrade():
+    # Summaries built from julianday() before it was rounded are a hair short
+    op.execute('UPDATE qtimer_timers SET closed_seconds = round(closed_seconds, 3)')
+
+
+def downgrade():
+    pass
@@ -0,0 +1,44 @@
+"""Query indexes
+
+Revision ID: 454ec93be808
+Revises: 0407f0c67ae
+Create Date: 2026-10-18 15:52:40.918322
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '454ec93be808'
+down_revision = '0407f0c67ae'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+
+def upgrade():
+    op.create_index('ix_qtimer_tickets_ticket_id', 'qtimer_tickets', ['ticket_id'])
+    op.create_index('ix_qtimer_tickets_project_id', 'qtimer_tickets', ['project_id'])
+    op.create_index('ix_qtimer_timers_ticket_id', 'qtimer_timers', ['ticket_id'])
+    op.create_index('ix_qtimer_sessions_start', 'qtimer_sessions', ['start'])
+    op.create_index('ix_qtimer_sessions_timer_start', 'qtimer_sessions',
+        ['timer_id', 'start', 'end'])
+
+    # Partial indexes, only rows of running timers are indexed
+    op.execute('CREATE INDEX ix_qtimer_sessions_open '
+        'ON qtimer_sessions (timer_id) WHERE "end" IS NULL')
+    op.execute('CREATE INDEX ix_qtimer_timers_running '
+        'ON qtimer_timers (open_start) WHERE open_start IS NOT NULL')
+
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    op.drop_index('ix_qtimer_timers_running', 'qtimer_timers')
+    op.drop_index('ix_qtimer_sessions_open', 'qtimer_sessions')
+    op.drop_index('ix_qtimer_sessions_timer_start', 'qtimer_sessions')
+    op.drop_index('ix_qtimer_sessions_start', 'qtimer_sessions')
+    op.drop_index('ix_qtimer_timers_ticket_id', 'qtimer_timers')
+    op.drop_index('ix_qtimer_tickets_project_id', 'qtimer_tickets')
+    op.drop_index('ix_qtimer_tickets_ticket_id', 'qtimer_tickets')
@@ -0,0 +1,59 @@
+"""Name search
+
+Revision ID: 4cf06171122a
+Revises: 454ec93be808
+Create Date: 2026-10-18 16:03:18.551093
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4cf06171122a'
+down_revision = '454ec93be808'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+# Tables whose name column gets a full text index
+INDEXED_TABLES = ('qtimer_projects', 'qtimer_tickets', 'qtimer_timers', )
+
+
+def has_fts5():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return False
+    return bool(bind.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def upgrade():
+    # Without FTS5 searches keep using LIKE, see qtimer.search
+    if not has_fts5():
+        return
+
+    for name in INDEXED_TABLES:
+        fts = name + '_fts'
+        op.execute("CREATE VIRTUAL TABLE %(fts)s USING fts5("
+            "name, content='%(name)s', content_rowid='id')" % locals())
+        op.execute("INSERT INTO %(fts)s(%(fts)s) VALUES ('rebuild')" % locals())
+
+        # Keep the index up to date with every write to the table
+        op.execute("CREATE TRIGGER %(fts)s_insert AFTER INSERT ON %(name)s BEGIN "
+            "INSERT INTO %(fts)s(rowid, name) VALUES (new.id, new.name); "
+            "END" % locals())
+        op.execute("CREATE TRIGGER %(fts)s_delete AFTER DELETE ON %(name)s BEGIN "
+            "INSERT INTO %(fts)s(%(fts)s, rowid, name) VALUES ('delete', old.id, old.name); "
+            "END" % locals())
+        op.execute("CREATE TRIGGER %(fts)s_update AFTER UPDATE OF id, name ON %(name)s BEGIN "
+            "INSERT INTO %(fts)s(%(fts)s, rowid, name) VALUES ('delete', old.id, old.name); "
+            "INSERT INTO %(fts)s(rowid, name) VALUES (new.id, new.name); "
+            "END" % locals())
+
+
+def downgrade():
+    for name in INDEXED_TABLES:
+        fts = name + '_fts'
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute('DROP TRIGGER IF EXISTS %s_%s' % (fts, trigger))
+        op.execute('DROP TABLE IF EXISTS %s' % fts)
@@ -0,0 +1,48 @@
+"""Post outbox
+
+Revision ID: d996c28ca81f
+Revises: 4cf06171122a
+Create Date: 2026-10-18 16:31:05.470218
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd996c28ca81f'
+down_revision = '4cf06171122a'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+
+def upgrade():
+    op.create_table('qtimer_postintents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.Unicode(length=64), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('ticket_id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.Unicode(length=16), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('last_error', sa.UnicodeText(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('ix_qtimer_postintents_state', 'qtimer_postintents', ['state'])
+    op.create_table('qtimer_postintent_timers',
+    sa.Column('intent_id', sa.Integer(), nullable=False),
+    sa.Column('timer_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['intent_id'], ['qtimer_postintents.id'], ),
+    sa.ForeignKeyConstraint(['timer_id'], ['qtimer_timers.id'], ),
+    sa.PrimaryKeyConstraint('intent_id', 'timer_id')
+    )
+    op.create_index('ix_qtimer_postintent_timers_timer_id', 'qtimer_postintent_timers', ['timer_id'])
+
+
+def downgrade():
+    op.drop_index('ix_qtimer_postintent_timers_timer_id', 'qtimer_postintent_timers')
+    op.drop_table('qtimer_postintent_timers')
+    op.drop_index('ix_qtimer_postintents_state', 'qtimer_postintents')
+    op.drop_table('qtimer_postintents')
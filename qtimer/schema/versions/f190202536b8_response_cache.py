@@ -0,0 +1,31 @@
+"""Response cache
+
+Revision ID: f190202536b8
+Revises: d996c28ca81f
+Create Date: 2026-10-18 17:12:44.028371
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f190202536b8'
+down_revision = 'd996c28ca81f'
+
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy.sql.expression import *
+
+
+
+def upgrade():
+    op.create_table('qtimer_cachedresponses',
+    sa.Column('key', sa.Unicode(length=40), nullable=False),
+    sa.Column('etag', sa.Unicode(length=256), nullable=True),
+    sa.Column('last_modified', sa.Unicode(length=64), nullable=True),
+    sa.Column('payload', sa.PickleType(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('qtimer_cachedresponses')
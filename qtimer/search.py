@@ -0,0 +1,45 @@
+# Name searches backed by SQLite's FTS5 full text index, see the
+# name_search migration.  Falls back to LIKE when there is no index.
+
+import re
+
+from sqlalchemy.sql import table, column, literal_column
+
+FTS_TABLE = '%s_fts'
+
+# Whether each full text table exists, the schema won't change while we run
+_ftsTables = {}
+
+
+def has_fts(session, ftsName):
+	if ftsName not in _ftsTables:
+		found = session.execute(
+			"SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = :name",
+			{ 'name': ftsName }).scalar()
+		_ftsTables[ftsName] = bool(found)
+	return _ftsTables[ftsName]
+
+
+def fts_query(term):
+	''' Match every word of term as the prefix of a word in the name '''
+	words = re.findall(r'\w+', term)
+	return ' '.join('"%s"*' % word for word in words)
+
+
+def name_search(q, session, ormClass, term, rank=False):
+	'''
+	Filter q to rows of ormClass whose name matches term, ormClass must
+	already be part of q.  With rank, the best matches come first.
+	'''
+	ftsName = FTS_TABLE % ormClass.__tablename__
+	match = fts_query(term)
+	if not match or session.bind.dialect.name != 'sqlite' \
+			or not has_fts(session, ftsName):
+		return q.filter(ormClass.name.like('%' + term + '%'))
+
+	fts = table(ftsName, column('rowid'), column('rank'))
+	q = q.join(fts, fts.c.rowid == ormClass.id)\
+		.filter(literal_column(ftsName).match(match))
+	if rank:
+		q = q.order_by(fts.c.rank)
+	return q
@@ -20,8 +20,53 @@ strings = {
 	'command_find_id': 'Find a specific id',
 	'command_find_group': 'Show timers from a specific group',
 	'command_find_project': 'Find tickets in a project',
+	'command_find_limit': 'Show at most this many results',
+	'command_find_after_id': 'Only show results with a greater id, for paging through results',
 	'command_post': 'Post a timer to the configured remote source',
+	'command_post_aggregate': 'Post timers on the same ticket, day and billable status as one entry',
+	'command_post_flush': 'Send timers waiting to be posted now instead of queueing more',
+	'command_post_unknown': 'List posts which may or may not have reached the remote source',
+	'command_post_mark_sent': 'Mark posts with an unknown outcome as posted',
+	'command_post_failed': 'List posts which the remote source refused',
+	'command_post_requeue': 'Send posts with an unknown outcome or which failed again',
+	'command_post_cancel': 'Drop posts which were not sent so their timers can be changed or posted again',
 	'command_refresh': 'Refresh configured remote source immediately',
+	'command_check': 'Rebuild the summary kept for each timer from its sessions',
+	'command_report': 'Show time spent, grouped by day, week, project, ticket or billable status',
+	'command_report_from': 'First day to report on (YYYY-MM-DD)',
+	'command_report_to': 'Last day to report on (YYYY-MM-DD)',
+	'command_report_by': 'What to group time by, in order',
+	'command_export': 'Export timers and their sessions (times in UTC) as JSON lines or CSV',
+	'command_export_format': 'Format to write',
+	'command_export_output': 'File to write to instead of standard output',
+	'command_export_from': 'Only export sessions started on or after this day (YYYY-MM-DD)',
+	'command_export_to': 'Only export sessions started on or before this day (YYYY-MM-DD)',
+	'command_export_posted': 'Only export posted timers',
+	'command_export_unposted': 'Only export timers which have not been posted',
+	'command_import': 'Import timers and their sessions from JSON lines or CSV, as written by export',
+	'command_import_file': "File to read, or '-' for standard input",
+	'command_import_format': 'Format of the file, guessed from its name if not given',
+	'command_import_dry_run': 'Only check the file and report conflicts',
+	'command_import_batch': 'How many timers are written per transaction',
+
+	'post_queued': 'Queued %d timers for posting',
+	'post_busy': 'Timers are already being posted by another process',
+	'refresh_busy': 'The remote source is already being refreshed by another process',
+	'post_ok': 'Posted',
+	'post_failed': 'Failed: %s',
+	'post_unknown': 'Unknown: %s',
+	'post_interrupted': 'Posting was interrupted',
+	'post_check_remote': ('%d posts may or may not have been recorded by the remote source. '
+		'Check it, then run post --mark-sent or post --requeue with their ids'),
+	'post_resolved': 'Resolved %d posts',
+	'post_check_failed': ('%d posts were refused by the remote source. '
+		'Fix them, then run post --requeue or post --cancel with their ids'),
+	'post_cancelled': 'Cancelled %d posts',
+
+	'import_result': 'Imported %d timers with %d sessions, skipped %d timers with conflicts',
+	'import_dry_run': 'Would import %d timers with %d sessions, %d timers have conflicts',
+
+	'check_result': 'Rebuilt summaries of %d timers, %d were out of date',
 
 	'new_db': 'Creating new database for schema version: %d',
 	'old_data': 'Reloading cache from configured remote source: %s://%s',
@@ -53,6 +98,20 @@ strings = {
 		'Name',
 	),
 
+	'report_total': 'Total',
+
+	'post_header': (
+		'ID',
+		'Timers',
+		'Result',
+	),
+
+	'conflicts_header': (
+		'Line',
+		'Timer',
+		'Conflict',
+	),
+
 	'tickets_header': (
 		'PID',
 		'Project Name',
@@ -1,7 +1,10 @@
 import logging
+import time
+import zlib
 
 from contextlib import contextmanager
 from datetime import datetime
+from os import path, listdir
 
 from qtimer.lib import tz
 import qtimer.env
@@ -18,6 +21,16 @@ def expand_env_var(varname, string):
 	return string.replace(varname, varval)
 
 
+def schema_fingerprint(scriptLocation):
+	'''
+	A positive 31 bit number identifying the set of migration scripts, small
+	enough to be stored in SQLite's PRAGMA user_version
+	'''
+	versions = path.join(scriptLocation, 'versions')
+	scripts = sorted(f for f in listdir(versions) if f.endswith('.py'))
+	return (zlib.crc32('\n'.join(scripts).encode('utf-8')) & 0x7fffffff) or 1
+
+
 def smart_truncate(content, length=100, suffix='...'):
 	length = length - len(suffix)
 	if len(content) <= length:
@@ -30,11 +43,54 @@ def parse_time(dateStr):
 	return datetime.strptime(dateStr, '%Y-%m-%d %H:%M')
 
 
+def parse_date(dateStr):
+	''' A local date as the naive UTC datetime of its midnight '''
+	local = datetime.strptime(dateStr, '%Y-%m-%d').replace(tzinfo=tz.Local)
+	return local.astimezone(tz.UTC).replace(tzinfo=None)
+
+
+def local_date(datetime):
+	utc = datetime.replace(tzinfo=tz.UTC)
+	return utc.astimezone(tz.Local).date()
+
+
 def format_time(datetime):
 	utc = datetime.replace(tzinfo=tz.UTC)
 	return utc.astimezone(tz.Local).strftime('%x %H:%M')
 
 
+def chunked(iterable, size):
+	chunk = []
+	for item in iterable:
+		chunk.append(item)
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def retry(func, retries=3, backoff=1.0, transient=lambda e: True):
+	'''
+	Call func until it returns, at most retries more times after the first
+	failure, waiting backoff seconds before the first retry and doubling
+	the wait after every further failure.  Failures for which transient(e)
+	is false are raised right away, trying again would not help
+	'''
+	attempt = 0
+	while True:
+		try:
+			return func()
+		except Exception as e:
+			if attempt >= retries or not transient(e):
+				raise
+			delay = backoff * (2 ** attempt)
+			logging.getLogger(__name__).warn('Attempt %d failed with %s, retrying in %.1fs',
+				attempt + 1, repr(e), delay)
+			time.sleep(delay)
+			attempt += 1
+
+
 @contextmanager
 def autocommit(session):
 	try:
@@ -16,12 +16,12 @@ setup(
 	package_data={'qtimer':
 		['schema/*.py', 'schema/versions/*.py', 'default.ini'],
 	},
-	scripts=['bin/qtimer', ],
+	scripts=['bin/qtimer', 'bin/qtimerd', 'bin/qtimerc', ],
 	license='GPL/Multi-license: see LICENSE.txt',
 	description='A small timer program that integrates with various project management solutions',
 	long_description=open('README.md').read(),
 	install_requires=[
-		'sqlalchemy >= 0.7.9',
+		'sqlalchemy >= 0.9',
 		'alembic >= 0.4.1',
 		'appdirs >= 1.2.0'
 	],
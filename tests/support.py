@@ -0,0 +1,58 @@
+# Helpers shared by the tests and benchmarks: a throwaway home directory
+# with a config based on default.ini, so nothing touches the real database
+
+from os import path
+from unittest import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from qtimer.env import SCRIPT_ROOT, INI_NAME, LOG_NAME, SOCKET_NAME, MANIFEST_NAME
+
+DEFAULT_URL = 'sqlite:///DATA_DIR/qtimer.db'
+
+REPO_ROOT = path.dirname(SCRIPT_ROOT)
+
+
+def scratch_config(directory):
+	''' Writes the default config with its database moved into directory '''
+	with open(path.join(SCRIPT_ROOT, 'default.ini')) as defaults:
+		text = defaults.read()
+
+	configPath = path.join(directory, INI_NAME)
+	with open(configPath, 'w') as config:
+		config.write(text.replace(DEFAULT_URL,
+			'sqlite:///' + path.join(directory, 'qtimer.db')))
+	return configPath
+
+
+class ScratchHomeTestCase(unittest.TestCase):
+	''' Gives every test its own home directory holding a qTimer config '''
+
+	def setUp(self):
+		self.home = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.home, True)
+		self.configPath = scratch_config(self.home)
+
+		# Whatever runs in this process keeps its locks, logs and command
+		# manifest in the scratch home too
+		dataDir = path.join(self.home, 'data')
+		for target, value in (
+				('qtimer.env.DATA_DIR', dataDir),
+				('qtimer.env.SOCKET_PATH', path.join(dataDir, SOCKET_NAME)),
+				('qtimer.core.DATA_DIR', dataDir),
+				('qtimer.core.LOG_PATH', path.join(self.home, LOG_NAME)),
+				('qtimer.background.DATA_DIR', dataDir),
+				('qtimer.manifest.MANIFEST_PATH', path.join(self.home, MANIFEST_NAME))):
+			patcher = mock.patch(target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def environ(self):
+		''' Environment for running qTimer in a subprocess against this home '''
+		env = dict(os.environ)
+		env['HOME'] = self.home
+		env['PYTHONPATH'] = os.pathsep.join(
+			[ REPO_ROOT ] + [ p for p in env.get('PYTHONPATH', '').split(os.pathsep) if p ])
+		return env
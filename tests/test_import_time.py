@@ -0,0 +1,61 @@
+# Guards the cold start of commands which never touch the database
+
+import os
+import subprocess
+import sys
+import unittest
+
+from tests.support import ScratchHomeTestCase
+
+# Cumulative import time allowed for `qtimer --help`, in milliseconds
+BUDGET_MS = float(os.environ.get('QTIMER_IMPORT_BUDGET_MS', 150))
+
+# Only needed once a command uses the database
+HEAVY_PACKAGES = ('sqlalchemy', 'alembic', )
+
+
+def parse_importtime(output):
+	''' Returns the imported module names and the total time in microseconds '''
+	modules = []
+	total = 0
+	for line in output.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+		selfTime, cumulative, name = line[len('import time:'):].split('|')
+		modules.append(name.strip())
+		# Nested imports are indented and already counted by their parent
+		if not name[1:].startswith(' '):
+			total += int(cumulative)
+	return modules, total
+
+
+class ImportTimeTest(ScratchHomeTestCase):
+
+	def importtime(self, *args):
+		result = subprocess.run(
+			[ sys.executable, '-X', 'importtime', '-m', 'qtimer.cmd_line' ] + list(args),
+			env=self.environ(), cwd=self.home, stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE, universal_newlines=True)
+		self.assertEqual(result.returncode, 0, result.stderr)
+		return parse_importtime(result.stderr)
+
+	def setUp(self):
+		super(ImportTimeTest, self).setUp()
+		# The first run builds the command manifest, which imports every command
+		self.importtime('--help')
+
+	def test_help_skips_database_stack(self):
+		modules = self.importtime('--help')[0]
+		heavy = [ m for m in modules if m.split('.')[0] in HEAVY_PACKAGES ]
+		self.assertEqual(heavy, [])
+		self.assertNotIn('qtimer.model', modules)
+
+	def test_help_within_budget(self):
+		# Best of a few runs, a busy machine shouldn't fail the test
+		total = min(self.importtime('--help')[1] for i in range(3))
+		self.assertLess(total / 1000, BUDGET_MS,
+			'qtimer --help spent %.1fms importing modules' % (total / 1000))
+
+
+if __name__ == '__main__':
+	unittest.main()
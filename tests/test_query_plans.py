@@ -0,0 +1,148 @@
+# Checks that the queries behind the commands which look up timers are
+# answered from an index, on a database built by the migrations
+
+from datetime import datetime, timedelta
+from unittest import mock
+import re
+import unittest
+
+from sqlalchemy import event
+
+from tests.support import ScratchHomeTestCase
+from qtimer.cmd_line import QTimerCommandLine
+from qtimer.core import QTimerCore
+from qtimer.model import Project, Ticket, Timer, Session, PersistentVar, \
+	refresh_summaries
+
+PROJECTS = 2
+TICKETS = 4
+TIMERS = 20
+SESSIONS_PER_TIMER = 5
+RUNNING_TIMER = 5
+
+
+class QueryPlanTest(ScratchHomeTestCase):
+
+	def setUp(self):
+		super(QueryPlanTest, self).setUp()
+		self.core = QTimerCore(self.configPath)
+		self.addCleanup(self.core.close)
+		self.program = QTimerCommandLine(self.core)
+
+		now = datetime.utcnow()
+		session = self.core.session
+		# Commands must not try to sync with the remote source
+		session.add(PersistentVar(name='internal.lastSynced', value=now))
+		for projectId in range(1, PROJECTS + 1):
+			session.add(Project(id=projectId, name='Project %d' % projectId))
+		for ticketId in range(1, TICKETS + 1):
+			session.add(Ticket(id=ticketId, name='Ticket %d' % ticketId,
+				ticket_id=100 + ticketId, project_id=ticketId % PROJECTS + 1))
+		session.flush()
+		for timerId in range(1, TIMERS + 1):
+			running = timerId == RUNNING_TIMER
+			session.add(Timer(id=timerId, name='Timer %d' % timerId,
+				ticket_id=timerId % TICKETS + 1))
+			for hour in range(SESSIONS_PER_TIMER):
+				session.add(Session(timer_id=timerId,
+					start=now - timedelta(hours=hour + 1),
+					end=None if running and hour == 0 else now - timedelta(hours=hour)))
+		refresh_summaries(session)
+		session.commit()
+
+	def capture(self, func):
+		''' Returns the (statement, parameters) func sent to the database '''
+		statements = []
+		def record(conn, cursor, statement, parameters, context, executemany):
+			statements.append((statement, parameters))
+		event.listen(self.core.engine, 'before_cursor_execute', record)
+		try:
+			func()
+		finally:
+			event.remove(self.core.engine, 'before_cursor_execute', record)
+		return statements
+
+	def run_command(self, *argv):
+		return self.capture(lambda: self.program.executeCommand(
+			self.program.parseArgs(list(argv))))
+
+	def plan(self, statement, parameters):
+		connection = self.core.engine.raw_connection()
+		try:
+			rows = connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+			return [ row[-1] for row in rows ]
+		finally:
+			connection.close()
+
+	def assertIndexed(self, statements, pattern, table):
+		''' Every statement matching pattern reads table through an index '''
+		matching = [ (s, p) for s, p in statements if re.search(pattern, s, re.S) ]
+		self.assertTrue(matching, 'No statement matched %s' % pattern)
+
+		for statement, parameters in matching:
+			steps = [ step for step in self.plan(statement, parameters)
+				if re.match(r'(SCAN|SEARCH) %s\b' % table, step) ]
+			self.assertTrue(steps, 'Plan of %s never reads %s' % (statement, table))
+			# A SCAN walks the whole table, even when it does so through an index
+			for step in steps:
+				self.assertRegex(step,
+					r'^SEARCH .* USING ((COVERING )?INDEX|INTEGER PRIMARY KEY)',
+					'Full scan in plan of %s' % statement)
+
+	def test_show_uses_running_index(self):
+		statements = self.run_command('show')
+		self.assertIndexed(statements, r'open_start IS NOT NULL', 'qtimer_timers')
+
+	def test_stop_uses_index(self):
+		statements = self.run_command('stop', str(RUNNING_TIMER))
+		self.assertIndexed(statements, r'^UPDATE qtimer_sessions', 'qtimer_sessions')
+		# Rebuilding the summary looks up the sessions of the timer
+		self.assertIndexed(statements, r'^UPDATE qtimer_timers', 'qtimer_sessions')
+
+	def test_find_timer_by_id_uses_key(self):
+		statements = self.run_command('find', 'timers', '--id', '3')
+		self.assertIndexed(statements, r'FROM qtimer_timers', 'qtimer_timers')
+
+	def test_find_timers_by_ticket_use_index(self):
+		statements = self.run_command('find', 'timers', '-t', 'Ticket 2')
+		for table in ('qtimer_tickets', 'qtimer_timers'):
+			self.assertIndexed(statements, r'qtimer_tickets_fts', table)
+
+	def test_find_timers_by_project_use_index(self):
+		statements = self.run_command('find', 'timers', '-p', 'Project 1')
+		for table in ('qtimer_projects', 'qtimer_tickets', 'qtimer_timers'):
+			self.assertIndexed(statements, r'qtimer_projects_fts', table)
+
+	def test_restart_uses_index(self):
+		statements = self.run_command('restart', '3')
+		self.assertIndexed(statements, r'^SELECT .*FROM qtimer_timers', 'qtimer_timers')
+		self.assertIndexed(statements, r'^UPDATE qtimer_timers', 'qtimer_sessions')
+
+	def test_edit_uses_index(self):
+		statements = self.run_command('edit', '4', '-s', '2000-01-01 09:00', '-t', '2')
+		self.assertIndexed(statements, r'^SELECT .*FROM qtimer_sessions', 'qtimer_sessions')
+		self.assertIndexed(statements, r'^UPDATE qtimer_timers SET ticket_id', 'qtimer_timers')
+		self.assertIndexed(statements, r'^UPDATE qtimer_timers SET first_start', 'qtimer_sessions')
+
+	def test_delete_uses_index(self):
+		statements = self.run_command('delete', '6')
+		self.assertIndexed(statements, r'^SELECT .*FROM qtimer_timers', 'qtimer_postintent_timers')
+		self.assertIndexed(statements, r'^DELETE FROM qtimer_sessions', 'qtimer_sessions')
+		for table in ('qtimer_timers', 'qtimer_postintent_timers'):
+			self.assertIndexed(statements, r'^DELETE FROM qtimer_timers', table)
+
+	def test_post_enqueue_uses_index(self):
+		# Only the queueing is looked at, nothing is sent
+		with mock.patch('qtimer.background.spawn'):
+			statements = self.run_command('post', '-i', '7')
+		for table in ('qtimer_timers', 'qtimer_sessions', 'qtimer_postintent_timers'):
+			self.assertIndexed(statements, r'^SELECT .* qtimer_postintent_timers', table)
+
+	def test_sessions_of_timer_use_index(self):
+		timer = self.core.session.query(Timer).get(1)
+		statements = self.capture(lambda: list(timer.sessions))
+		self.assertIndexed(statements, r'FROM qtimer_sessions', 'qtimer_sessions')
+
+
+if __name__ == '__main__':
+	unittest.main()